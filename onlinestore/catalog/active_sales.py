@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .cache import CatalogCache
+from .models import Product
+
+# продукт на распродаже: цена распродажи и оба конца окна заданы, продукт не в архиве
+SALE_FILTER = Q(
+    archived=False,
+    salePrice__isnull=False,
+    dateFrom__isnull=False,
+    dateTo__isnull=False,
+)
+# продукт перестает быть на распродаже сразу после dateTo
+AFTER_END = timedelta(microseconds=1)
+
+
+class ActiveSales:
+    """
+    Предвычисленный список продуктов на распродаже и окно времени [valid_from, valid_until),
+    в котором он не меняется: от последней пройденной границы dateFrom/dateTo до ближайшей следующей
+    (None - границы нет).
+    Хранится в общем кэше по счетчику поколения "product", время жизни - до следующей границы,
+    поэтому список и зависящие от него ответы остаются верными без короткого TTL.
+    Изменение продуктов (в том числе расписания распродаж в админке) увеличивает счетчик,
+    и список пересчитывается при следующем обращении
+    """
+
+    PREFIX = f"{CatalogCache.PREFIX}:active_sales"
+
+    def __init__(self, ids, valid_from, valid_until):
+        self.ids = ids
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+
+    def is_valid(self, now) -> bool:
+        return (self.valid_from is None or self.valid_from <= now) and (
+            self.valid_until is None or now < self.valid_until
+        )
+
+    @classmethod
+    def get(cls) -> "ActiveSales":
+        now = timezone.now()
+        (generation,) = CatalogCache.generations(("product",))
+        key = f"{cls.PREFIX}:{generation}"
+        snapshot = cache.get(key)
+        if snapshot is None or not snapshot.is_valid(now):
+            snapshot = cls.load(now)
+            timeout = (
+                (snapshot.valid_until - now).total_seconds()
+                if snapshot.valid_until
+                else None
+            )
+            cache.set(key, snapshot, timeout=timeout)
+        return snapshot
+
+    @classmethod
+    def load(cls, now) -> "ActiveSales":
+        """
+        Список продуктов на распродаже в момент now и границы окна: два запроса по индексу
+        (archived, dateFrom, dateTo)
+        """
+        products = Product.objects.filter(SALE_FILTER)
+        ids = sorted(
+            products.filter(dateFrom__lte=now, dateTo__gte=now).values_list(
+                "pk", flat=True
+            )
+        )
+        bounds = products.aggregate(
+            last_start=Max("dateFrom", filter=Q(dateFrom__lte=now)),
+            last_end=Max("dateTo", filter=Q(dateTo__lt=now)),
+            next_start=Min("dateFrom", filter=Q(dateFrom__gt=now)),
+            next_end=Min("dateTo", filter=Q(dateTo__gte=now)),
+        )
+        passed = [
+            bounds["last_start"],
+            bounds["last_end"] and bounds["last_end"] + AFTER_END,
+        ]
+        upcoming = [
+            bounds["next_start"],
+            bounds["next_end"] and bounds["next_end"] + AFTER_END,
+        ]
+        return cls(
+            ids,
+            max(filter(None, passed), default=None),
+            min(filter(None, upcoming), default=None),
+        )
+
+    @classmethod
+    def window(cls) -> tuple:
+        """
+        Окно текущего списка (timestamp начала или 0, timestamp конца или None) для cached_response
+        и conditional_response
+        """
+        snapshot = cls.get()
+        return (
+            snapshot.valid_from.timestamp() if snapshot.valid_from else 0,
+            snapshot.valid_until.timestamp() if snapshot.valid_until else None,
+        )
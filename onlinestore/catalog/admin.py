@@ -5,7 +5,18 @@ from django.contrib import admin
 from django.db.models import QuerySet
 from django.http import HttpRequest
 
-from .models import Product, Image, Tag, Review, Category, Specification
+from .models import (
+    Product,
+    Image,
+    Tag,
+    Review,
+    Category,
+    CategoryPriceStats,
+    Specification,
+)
+from .cache import CatalogCache
+from .columnar_index import ProductFeed
+from .search import ProductSearch
 
 
 class ImagesInline(StackedInline):
@@ -58,7 +69,7 @@ class ProductAdmin(ModelAdmin):
     )
 
     list_display_links = ["pk", "title", "category", "fullDescription"]
-    actions = ["mark_archived", "mark_unarchived"]
+    actions = ["mark_archived", "mark_unarchived", "reindex_search"]
 
     # создание поля для Inline объектов в админке в разделе Products
     inlines = [ImagesInline, ReviewsInline, SpecificationInline]
@@ -108,11 +119,23 @@ class ProductAdmin(ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+    # update() не отправляет сигналы, кэш и колоночный индекс каталога обновляются явно
     def mark_unarchived(self, request: HttpRequest, queryset: QuerySet):
+        category_ids = list(queryset.values_list("category_id", flat=True))
+        ProductFeed.publish(queryset.values_list("pk", flat=True))
         queryset.update(archived=False)
+        CategoryPriceStats.refresh(category_ids)
+        CatalogCache.bump("product")
 
     def mark_archived(self, request: HttpRequest, queryset: QuerySet):
+        category_ids = list(queryset.values_list("category_id", flat=True))
+        ProductFeed.publish(queryset.values_list("pk", flat=True))
         queryset.update(archived=True)
+        CategoryPriceStats.refresh(category_ids)
+        CatalogCache.bump("product")
+
+    def reindex_search(self, request: HttpRequest, queryset: QuerySet):
+        ProductSearch.index_products(queryset.values_list("pk", flat=True))
 
     def save_formset(self, request, form, formset, change):
         """
@@ -134,6 +157,7 @@ class ProductAdmin(ModelAdmin):
 
     mark_archived.short_description = "Архивировать"
     mark_unarchived.short_description = "Снять статус 'архивирован'"
+    reindex_search.short_description = "Обновить поисковый индекс"
 
 
 @admin.register(Tag)
@@ -1,32 +1,52 @@
 from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 
+from .active_sales import ActiveSales
+from .cache import conditional_response
 from .services import CatalogService
 from .swagger_schemas import (
     catalog_schema,
+    catalog_facets_schema,
     tags_schema,
     categories_schema,
     banners_schema,
     products_popular_schema,
     products_limited_schema,
     sales_schema,
+    home_schema,
     product_schema,
+    products_batch_schema,
     product_review_schema,
+    product_reviews_schema,
     get_basket_schema,
     add_basket_schema,
     delete_basket_schema,
+    basket_batch_schema,
+    cache_stats_schema,
+    category_breadcrumbs_schema,
 )
 
 
 @extend_schema(**catalog_schema)
 class CatalogAPIView(APIView):
+    @conditional_response("catalog")
     def get(self, request, *args):
         """Каталог продуктов"""
         return CatalogService.get_catalog(request)
 
 
+@extend_schema(**catalog_facets_schema)
+class CatalogFacetsAPIView(APIView):
+    @conditional_response("catalog_facets")
+    def get(self, request, *args):
+        """Фасеты каталога по характеристикам"""
+        return CatalogService.get_catalog_facets(request)
+
+
 @extend_schema(**tags_schema)
 class TagsAPIView(APIView):
+    @conditional_response("tags")
     def get(self, request, *args):
         """Теги"""
         return CatalogService.get_tags(request)
@@ -34,13 +54,23 @@ class TagsAPIView(APIView):
 
 @extend_schema(**categories_schema)
 class CategoriesAPIView(APIView):
+    @conditional_response("categories")
     def get(self, request, *args):
         """Категории продуктов"""
         return CatalogService.get_categories()
 
 
+@extend_schema(**category_breadcrumbs_schema)
+class CategoryBreadcrumbsAPIView(APIView):
+    @conditional_response("category_breadcrumbs", ("category",))
+    def get(self, request, id=None, format=None):
+        """Путь от корневой категории до категории"""
+        return CatalogService.get_category_breadcrumbs(id)
+
+
 @extend_schema(**banners_schema)
 class BannersAPIView(APIView):
+    @conditional_response("banners")
     def get(self, request, *args):
         """Баннеры"""
         return CatalogService.get_banners()
@@ -48,13 +78,15 @@ class BannersAPIView(APIView):
 
 @extend_schema(**products_popular_schema)
 class ProductsPopularAPIView(APIView):
+    @conditional_response("products_home_page")
     def get(self, request, *args):
         """Топ продуктов"""
-        return CatalogService.get_products_home_page(stop=8, sort_index=10)
+        return CatalogService.get_products_home_page(stop=8, popular=True)
 
 
 @extend_schema(**products_limited_schema)
 class ProductsLimitedAPIView(APIView):
+    @conditional_response("products_home_page")
     def get(self, request, *args):
         """Лимитированные продукты"""
         return CatalogService.get_products_home_page(stop=16, limit_edition=True)
@@ -62,25 +94,62 @@ class ProductsLimitedAPIView(APIView):
 
 @extend_schema(**sales_schema)
 class ProductsSalesAPIView(APIView):
+    @conditional_response("sales")
     def get(self, request, *args):
         """Распродажа продуктов"""
         return CatalogService.get_sales(request)
 
 
+@extend_schema(**home_schema)
+class HomeAPIView(APIView):
+    @conditional_response(
+        "home",
+        ("product", "category", "image", "popularity"),
+        window=ActiveSales.window,
+    )
+    def get(self, request, *args):
+        """Данные главной страницы"""
+        return CatalogService.get_home(request)
+
+
 @extend_schema(**product_schema)
 class ProductAPIView(APIView):
+    @conditional_response("product")
     def get(self, request, id=None, format=None):
         """Получить продукт"""
         return CatalogService.get_product(id)
 
 
-@extend_schema(**product_review_schema)
+@extend_schema(**products_batch_schema)
+class ProductsBatchAPIView(APIView):
+    @conditional_response("products_batch")
+    def get(self, request, *args):
+        """Продукты по списку id"""
+        return CatalogService.get_products_batch(request)
+
+
 class ProductReviewAPIView(APIView):
+    @extend_schema(**product_reviews_schema)
+    @conditional_response("product_reviews")
+    def get(self, request, id=None, format=None):
+        """Отзывы продукта"""
+        return CatalogService.get_product_reviews(request, id)
+
+    @extend_schema(**product_review_schema)
     def post(self, request, id=None, format=None):
         """Опубликовать отзыв на продукт"""
         return CatalogService.post_product_review(request, id)
 
 
+@extend_schema(**cache_stats_schema)
+class CacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args):
+        """Статистика кэша каталога"""
+        return CatalogService.get_cache_stats()
+
+
 class BasketAPIView(APIView):
     @extend_schema(**get_basket_schema)
     def get(self, request, *args):
@@ -96,3 +165,10 @@ class BasketAPIView(APIView):
     def delete(self, request, *args):
         """удалить продукты из корзины по одному, или всю позицию"""
         return CatalogService.delete_basket(request)
+
+
+class BasketBatchAPIView(APIView):
+    @extend_schema(**basket_batch_schema)
+    def post(self, request, *args):
+        """Пакет операций с корзиной"""
+        return CatalogService.change_basket_batch(request)
@@ -0,0 +1,136 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Max, Q, Subquery
+
+from .models import ProductAttribute
+
+# параметры фильтра по характеристикам: spec[<название>]=<значение> (можно несколько - любое из значений),
+# spec[<название>][min]=<число>, spec[<название>][max]=<число>
+SPEC_PARAM_RE = re.compile(r"^spec\[(?P<name>[^\]]+)\](?:\[(?P<bound>min|max)\])?$")
+
+
+class AttributeIndex:
+    """
+    Фильтры и фасеты каталога по характеристикам продуктов через нормализованный индекс ProductAttribute.
+    Условие по каждой характеристике разрешается индексом (name, value, product) или (name, number, product),
+    несколько характеристик - одним подзапросом с группировкой по продукту
+    """
+
+    @staticmethod
+    def parse(query_params) -> dict:
+        """
+        Условия фильтра из параметров запроса: {название: {"values": [...], "min": ..., "max": ...}}.
+        ValueError - если граница диапазона не число
+        """
+        conditions = {}
+        for param in query_params:
+            match = SPEC_PARAM_RE.match(param)
+            if not match:
+                continue
+            name = " ".join(match["name"].split())
+            condition = conditions.setdefault(
+                name, {"values": [], "min": None, "max": None}
+            )
+            if match["bound"]:
+                condition[match["bound"]] = float(query_params[param].replace(",", "."))
+            else:
+                condition["values"] += [
+                    " ".join(value.split())
+                    for value in query_params.getlist(param)
+                    if value.strip()
+                ]
+        return conditions
+
+    @staticmethod
+    def condition(name, condition) -> Q:
+        q = Q(name=name)
+        if condition["values"]:
+            q &= Q(value__in=condition["values"])
+        if condition["min"] is not None:
+            q &= Q(number__gte=condition["min"])
+        if condition["max"] is not None:
+            q &= Q(number__lte=condition["max"])
+        return q
+
+    @classmethod
+    def links(cls, conditions):
+        """
+        Подзапрос id продуктов, которые соответствуют условиям всех характеристик
+        """
+        links = ProductAttribute.objects.filter(
+            reduce(or_, (cls.condition(*item) for item in conditions.items()))
+        ).values("product_id")
+        if len(conditions) > 1:
+            links = links.annotate(names=Count("name", distinct=True)).filter(
+                names=len(conditions)
+            )
+        return links.values("product_id")
+
+    @classmethod
+    def filter(cls, conditions) -> dict:
+        """
+        Условие фильтрации продуктов по характеристикам для DAO.search_object_by_fields.
+        Ключ pk__in не пересекается с id__in фильтров тегов и поиска
+        """
+        if not conditions:
+            return {}
+        return {"pk__in": Subquery(cls.links(conditions))}
+
+    @classmethod
+    def product_ids(cls, conditions) -> list:
+        return sorted(cls.links(conditions).values_list("product_id", flat=True))
+
+    @classmethod
+    def facets(cls, products, conditions) -> list:
+        """
+        Значения характеристик с количеством продуктов из products (queryset id продуктов
+        без фильтра по характеристикам). Для характеристики из фильтра количество считается
+        с условиями остальных характеристик, чтобы были видны альтернативы выбранным значениям
+        """
+        groups = [
+            (
+                products.filter(**cls.filter(conditions)),
+                ~Q(name__in=list(conditions)) if conditions else Q(),
+            )
+        ]
+        for name in conditions:
+            others = {key: value for key, value in conditions.items() if key != name}
+            groups.append((products.filter(**cls.filter(others)), Q(name=name)))
+
+        facets = {}
+        for group_products, names in groups:
+            rows = (
+                ProductAttribute.objects.filter(names, product_id__in=group_products)
+                .values("name", "value")
+                .annotate(
+                    count=Count("product_id", distinct=True), number=Max("number")
+                )
+                .order_by()
+            )
+            for row in rows:
+                facets.setdefault(row["name"], []).append(row)
+
+        result = []
+        for name in sorted(facets):
+            rows = sorted(
+                facets[name],
+                key=lambda row: (
+                    row["number"] is None,
+                    row["number"] or 0,
+                    row["value"],
+                ),
+            )
+            numbers = [row["number"] for row in rows if row["number"] is not None]
+            result.append(
+                {
+                    "name": name,
+                    "values": [
+                        {"value": row["value"], "count": row["count"]} for row in rows
+                    ],
+                    "min": min(numbers, default=None),
+                    "max": max(numbers, default=None),
+                }
+            )
+        return result
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+# модели, изменение которых инвалидирует кэш ответов каталога
+CACHE_MODELS = ("product", "category", "tag", "image", "review", "specification")
+
+
+class CatalogCache:
+    """
+    Версионированный кэш ответов каталога.
+    Ключ состоит из имени метода, нормализованных параметров запроса и счетчиков поколений моделей,
+    от которых зависит ответ. Изменение модели увеличивает её счетчик, и старые ключи больше не читаются
+    """
+
+    PREFIX = "catalog"
+
+    @classmethod
+    def generations(cls, models) -> list:
+        keys = [f"{cls.PREFIX}:gen:{model}" for model in models]
+        values = cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in values}
+        if missing:
+            # при вытеснении счетчика начинаем с уникального значения, чтобы не попасть на старые ключи
+            cache.set_many(missing, timeout=None)
+            values.update(missing)
+        return [values[key] for key in keys]
+
+    @classmethod
+    def changed_at(cls, models) -> float:
+        """
+        Время последнего изменения указанных моделей (timestamp)
+        """
+        keys = [f"{cls.PREFIX}:changed:{model}" for model in models]
+        values = cache.get_many(keys)
+        missing = {key: time.time() for key in keys if key not in values}
+        if missing:
+            # время изменения неизвестно (вытеснено из кэша) - считаем, что модель изменилась сейчас
+            cache.set_many(missing, timeout=None)
+            values.update(missing)
+        return max(values.values())
+
+    @classmethod
+    def bump(cls, *models) -> list:
+        """
+        Инвалидация всех ответов, зависящих от указанных моделей, возвращает новые значения счетчиков
+        """
+        cache.set_many(
+            {f"{cls.PREFIX}:changed:{model}": time.time() for model in models},
+            timeout=None,
+        )
+        generations = []
+        for model in models:
+            key = f"{cls.PREFIX}:gen:{model}"
+            try:
+                generations.append(cache.incr(key))
+            except ValueError:
+                generations.append(time.time_ns())
+                cache.set(key, generations[-1], timeout=None)
+        return generations
+
+    @staticmethod
+    def normalize(args, kwargs) -> str:
+        """
+        Нормализованные параметры вызова: query-параметры запроса сортируются, порядок не влияет на ключ
+        """
+        params = []
+        for arg in (*args, *sorted(kwargs.items())):
+            if isinstance(arg, Request):
+                arg = sorted(
+                    (key, sorted(values)) for key, values in arg.query_params.lists()
+                )
+            params.append(arg)
+        return json.dumps(params, default=str, ensure_ascii=False)
+
+    @classmethod
+    def key(cls, name, models, params) -> str:
+        generations = ".".join(str(gen) for gen in cls.generations(models))
+        digest = hashlib.sha1(params.encode()).hexdigest()
+        return f"{cls.PREFIX}:{name}:{generations}:{digest}"
+
+    @classmethod
+    def count(cls, name, hit):
+        key = f"{cls.PREFIX}:stats:{name}:{'hits' if hit else 'misses'}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @classmethod
+    def stats(cls, names) -> dict:
+        """
+        Счетчики попаданий/промахов по методам
+        """
+        keys = [
+            f"{cls.PREFIX}:stats:{name}:{kind}"
+            for name in names
+            for kind in ("hits", "misses")
+        ]
+        values = cache.get_many(keys)
+        result = {}
+        for name in names:
+            hits = values.get(f"{cls.PREFIX}:stats:{name}:hits", 0)
+            misses = values.get(f"{cls.PREFIX}:stats:{name}:misses", 0)
+            total = hits + misses
+            result[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hitRate": round(hits / total, 4) if total else None,
+            }
+        return result
+
+
+# закэшированные методы: имя -> (модели, время жизни, окно), для статистики и условных GET-запросов
+CACHED_METHODS = {}
+
+
+def cached_response(name, models, timeout=None, window=None, extra_models=None):
+    """
+    Кэширование данных успешного ответа метода CatalogService.
+    models - модели, от которых зависит ответ, timeout - время жизни (по умолчанию CATALOG_CACHE_TIMEOUT).
+    window - для ответов, зависящих от текущего времени: функция, возвращающая окно (начало, конец или None)
+    в timestamp, в котором ответ не меняется. Начало окна входит в ключ, запись живет не дольше конца окна.
+    extra_models - функция от аргументов вызова, возвращающая модели, от которых зависит только часть
+    ответов метода (например, сортировка по популярности)
+    """
+    CACHED_METHODS[name] = (models, timeout, window, extra_models)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(cls, *args, **kwargs):
+            start, end = window() if window else (None, None)
+            params = (*args, start) if window else args
+            call_models = (
+                (*models, *extra_models(*args, **kwargs)) if extra_models else models
+            )
+            key = CatalogCache.key(
+                name, call_models, CatalogCache.normalize(params, kwargs)
+            )
+            data = cache.get(key)
+            if data is not None:
+                CatalogCache.count(name, hit=True)
+                return Response(data)
+
+            CatalogCache.count(name, hit=False)
+            response = method(cls, *args, **kwargs)
+            if response.status_code == 200:
+                cache_timeout = timeout or settings.CATALOG_CACHE_TIMEOUT
+                if end is not None:
+                    cache_timeout = min(cache_timeout, end - time.time())
+                cache.set(key, response.data, timeout=max(cache_timeout, 0))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_response(
+    name, models=None, timeout=None, window=None, extra_models=None
+):
+    """
+    Условный GET для метода get APIView: ETag и Last-Modified вычисляются по счетчикам поколений
+    и времени изменения моделей, без сериализации ответа. При совпадении If-None-Match/If-Modified-Since
+    возвращается 304, метод не вызывается.
+    models, timeout, window и extra_models по умолчанию берутся из cached_response метода сервиса
+    с тем же именем, extra_models вызывается с запросом.
+    Для ответов, зависящих от текущего времени, задается window (ETag меняется в начале окна, см. cached_response)
+    или timeout (ETag меняется не реже раза в timeout секунд)
+    """
+    if models is None:
+        models, timeout, window, extra_models = CACHED_METHODS[name]
+
+    def request_models(request):
+        return (*models, *extra_models(request)) if extra_models else models
+
+    def time_window():
+        if window:
+            return window()[0]
+        return int(time.time() // timeout) * timeout if timeout else None
+
+    def etag(request, *args, **kwargs):
+        params = CatalogCache.normalize(
+            (request.path, request.accepted_renderer.format, request, time_window()),
+            kwargs,
+        )
+        key = CatalogCache.key(name, request_models(request), params)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        changed_at = CatalogCache.changed_at(request_models(request))
+        if window or timeout:
+            changed_at = max(changed_at, time_window())
+        return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
@@ -0,0 +1,103 @@
+import threading
+
+from .cache import CatalogCache
+from .models import Category
+
+
+class CategoryTree:
+    """
+    Снимок дерева категорий в памяти процесса: id, связи с родителями, названия, url картинок
+    и множества потомков. Загружается одним запросом и перестраивается при изменении Category
+    (по счетчику поколения модели в кэше каталога)
+    """
+
+    _snapshot = None
+    _lock = threading.Lock()
+
+    def __init__(self, rows, generation=None):
+        self.generation = generation
+        storage = Category._meta.get_field("image").storage
+        self.nodes = {}
+        self.children = {}
+        for row in sorted(rows, key=lambda row: row["id"]):
+            self.nodes[row["id"]] = {
+                "id": row["id"],
+                "title": row["title"],
+                "parent_id": row["parent_id"],
+                "image": storage.url(row["image"]) if row["image"] else None,
+            }
+            self.children.setdefault(row["parent_id"], []).append(row["id"])
+
+        self.descendants = {}
+        for pk in self.nodes:
+            self._collect_descendants(pk)
+
+    @classmethod
+    def get(cls) -> "CategoryTree":
+        """
+        Актуальный снимок дерева, при изменении категорий перестраивается
+        """
+        (generation,) = CatalogCache.generations(("category",))
+        snapshot = cls._snapshot
+        if snapshot is None or snapshot.generation != generation:
+            with cls._lock:
+                snapshot = cls._snapshot
+                if snapshot is None or snapshot.generation != generation:
+                    rows = Category.objects.values("id", "title", "parent_id", "image")
+                    snapshot = cls(list(rows), generation)
+                    cls._snapshot = snapshot
+        return snapshot
+
+    def _collect_descendants(self, pk) -> frozenset:
+        if pk not in self.descendants:
+            # защита от циклов в данных
+            self.descendants[pk] = frozenset()
+            result = set()
+            for child in self.children.get(pk, ()):
+                result.add(child)
+                result |= self._collect_descendants(child)
+            self.descendants[pk] = frozenset(result)
+        return self.descendants[pk]
+
+    def image(self, pk):
+        node = self.nodes[pk]
+        if node["image"]:
+            return {"src": node["image"], "alt": node["title"]}
+        return None
+
+    def subcategories(self, pk) -> list:
+        return [
+            {
+                "id": child,
+                "title": self.nodes[child]["title"],
+                "image": self.image(child),
+            }
+            for child in self.children.get(pk, ())
+        ]
+
+    def categories(self) -> list:
+        """
+        Корневые категории с подкатегориями, в формате CategoriesSerializer
+        """
+        return [
+            {
+                "id": pk,
+                "title": self.nodes[pk]["title"],
+                "image": self.image(pk),
+                "subcategories": self.subcategories(pk),
+            }
+            for pk in self.children.get(None, ())
+        ]
+
+    def breadcrumbs(self, pk) -> list:
+        """
+        Путь от корневой категории до категории pk, O(глубины)
+        """
+        path = []
+        seen = set()
+        while pk is not None and pk in self.nodes and pk not in seen:
+            seen.add(pk)
+            node = self.nodes[pk]
+            path.append({"id": node["id"], "title": node["title"]})
+            pk = node["parent_id"]
+        return path[::-1]
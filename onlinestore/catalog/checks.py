@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def cache_backend_check(app_configs, **kwargs):
+    """
+    Кэш ответов каталога инвалидируется счетчиками поколений в общем кэше: с кэшем процесса
+    изменения из management-команд и других воркеров не видны до истечения CATALOG_CACHE_TIMEOUT
+    """
+    if (
+        settings.DEBUG
+        or settings.TESTING
+        or not settings.CACHES["default"]["BACKEND"].endswith("LocMemCache")
+    ):
+        return []
+    return [
+        Warning(
+            "The default cache is a per-process LocMemCache.",
+            hint=(
+                "Catalog cache invalidation from management commands and other workers "
+                "does not reach this process; use a shared backend "
+                "(FileBasedCache, redis or memcached)."
+            ),
+            id="catalog.W001",
+        )
+    ]
@@ -0,0 +1,335 @@
+import math
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # индекс отключается, каталог работает через ORM
+    np = None
+
+# журнал изменений продуктов в кэше: номер последней записи и записи со списками id продуктов
+FEED_SEQ_KEY = "catalog:product_feed:seq"
+FEED_TIMEOUT = 60 * 60 * 24
+# при большем отставании от журнала индекс перестраивается целиком
+FEED_MAX_LAG = 1000
+INT64_MAX = 2**63 - 1
+INT64_MIN = -(2**63)
+
+
+class ProductFeed:
+    """
+    Журнал изменений продуктов для инкрементального обновления колоночного индекса во всех процессах
+    """
+
+    @classmethod
+    def publish(cls, ids):
+        """
+        Запись id измененных продуктов в журнал после фиксации транзакции
+        """
+        ids = list(ids)
+        if ids:
+            transaction.on_commit(lambda: cls._append(ids))
+
+    @staticmethod
+    def _append(ids):
+        try:
+            seq = cache.incr(FEED_SEQ_KEY)
+        except ValueError:
+            cache.add(FEED_SEQ_KEY, 0, timeout=None)
+            seq = cache.incr(FEED_SEQ_KEY)
+        cache.set(f"catalog:product_feed:{seq}", ids, timeout=FEED_TIMEOUT)
+
+    @staticmethod
+    def seq() -> int:
+        return cache.get(FEED_SEQ_KEY, 0)
+
+    @staticmethod
+    def changes(start, stop):
+        """
+        id продуктов, измененных в записях (start, stop]; None - если записи вытеснены из кэша
+        """
+        keys = [f"catalog:product_feed:{seq}" for seq in range(start + 1, stop + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) != len(keys):
+            return None
+        return {pk for ids in entries.values() for pk in ids}
+
+
+class ColumnarIndex:
+    """
+    Колоночный снимок полей продуктов для фильтрации и сортировки каталога в памяти (NumPy).
+    Разрешает фильтр get_catalog в маску, сортировку - в argsort, из БД выбираются только id страницы.
+    Колонки упорядочены по id. Обновляется инкрементально по журналу ProductFeed,
+    полная перестройка выполняется в фоновом потоке
+    """
+
+    FIELDS = (
+        "id",
+        "price",
+        "salePrice",
+        "dateFrom",
+        "dateTo",
+        "count",
+        "freeDelivery",
+        "category_id",
+        "sortIndex",
+        "date",
+        "archived",
+        "rating",
+        "reviews_count",
+        "popularity",
+    )
+    # параметр sort каталога -> колонка индекса
+    SORTS = {
+        "price": "effective_price",
+        "date": "date",
+        "rating": "rating",
+        "reviews": "reviews_count",
+        "popularity": "popularity",
+    }
+
+    _snapshot = None
+    _lock = threading.Lock()
+    _rebuilding = False
+
+    def __init__(self, columns, seq=0):
+        self.seq = seq
+        for field in self.FIELDS:
+            setattr(self, field, columns[field])
+
+    @classmethod
+    def from_rows(cls, rows, seq=0) -> "ColumnarIndex":
+        """
+        Снимок из строк load_rows, строки упорядочены по id
+        """
+        data = dict(zip(cls.FIELDS, zip(*rows))) if rows else {}
+        columns = {
+            "id": np.array(data.get("id", ()), dtype=np.int64),
+            # цена в копейках, чтобы сравнения с границами фильтра были точными
+            "price": np.array(
+                [int(price * 100) for price in data.get("price", ())], dtype=np.int64
+            ),
+            "salePrice": np.array(
+                [int(price * 100) for price in data.get("salePrice", ())],
+                dtype=np.int64,
+            ),
+            # окно распродажи в микросекундах, без даты начала распродажа не начинается, без даты конца - закончена
+            "dateFrom": np.array(
+                [
+                    INT64_MAX if date is None else int(date.timestamp() * 1_000_000)
+                    for date in data.get("dateFrom", ())
+                ],
+                dtype=np.int64,
+            ),
+            "dateTo": np.array(
+                [
+                    INT64_MIN if date is None else int(date.timestamp() * 1_000_000)
+                    for date in data.get("dateTo", ())
+                ],
+                dtype=np.int64,
+            ),
+            "count": np.array(data.get("count", ()), dtype=np.int64),
+            "freeDelivery": np.array(data.get("freeDelivery", ()), dtype=bool),
+            "category_id": np.array(
+                [-1 if pk is None else pk for pk in data.get("category_id", ())],
+                dtype=np.int64,
+            ),
+            "sortIndex": np.array(data.get("sortIndex", ()), dtype=np.int64),
+            "date": np.array(
+                [int(date.timestamp() * 1_000_000) for date in data.get("date", ())],
+                dtype=np.int64,
+            ),
+            "archived": np.array(data.get("archived", ()), dtype=bool),
+            # NULL рейтинга - -inf: при сортировке по возрастанию первым, как в SQLite
+            "rating": np.array(
+                [
+                    -np.inf if rating is None else rating
+                    for rating in data.get("rating", ())
+                ],
+                dtype=np.float64,
+            ),
+            "reviews_count": np.array(data.get("reviews_count", ()), dtype=np.int64),
+            "popularity": np.array(data.get("popularity", ()), dtype=np.float64),
+        }
+        return cls(columns, seq)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return np is not None and settings.CATALOG_COLUMNAR_INDEX
+
+    @classmethod
+    def load_rows(cls, ids=None):
+        products = Product.objects.order_by("id")
+        if ids is not None:
+            products = products.filter(id__in=ids)
+        return list(products.values_list(*cls.FIELDS).iterator(chunk_size=10_000))
+
+    @classmethod
+    def get(cls):
+        """
+        Актуальный снимок, догоняющий журнал изменений. None - если снимка еще нет или журнал
+        вытеснен из кэша: снимок перестраивается в фоне, каталог до тех пор работает через ORM
+        """
+        seq = ProductFeed.seq()
+        snapshot = cls._snapshot
+        if snapshot is not None and snapshot.seq == seq:
+            return snapshot
+
+        with cls._lock:
+            snapshot = cls._snapshot
+            if snapshot is not None and snapshot.seq == seq:
+                return snapshot
+            changed = None
+            if snapshot is not None and 0 < seq - snapshot.seq <= FEED_MAX_LAG:
+                changed = ProductFeed.changes(snapshot.seq, seq)
+            if changed is None:
+                cls.rebuild_in_background()
+                return None
+            snapshot = snapshot.refreshed(changed, seq)
+            cls._snapshot = snapshot
+        return snapshot
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Построение снимка целиком; изменения после чтения номера журнала применятся инкрементально
+        """
+        seq = ProductFeed.seq()
+        snapshot = cls.from_rows(cls.load_rows(), seq)
+        with cls._lock:
+            if cls._snapshot is None or cls._snapshot.seq <= seq:
+                cls._snapshot = snapshot
+
+    @classmethod
+    def rebuild_in_background(cls):
+        """
+        Запуск перестройки в фоновом потоке, если она еще не идет. Вызывается под _lock
+        """
+        if cls._rebuilding:
+            return
+        cls._rebuilding = True
+
+        def run():
+            try:
+                cls.rebuild()
+            finally:
+                cls._rebuilding = False
+                connection.close()
+
+        threading.Thread(target=run, name="catalog-columnar-index", daemon=True).start()
+
+    @classmethod
+    def warm(cls):
+        """
+        Построение индекса при старте воркера
+        """
+        if cls.is_available():
+            cls.rebuild()
+
+    def refreshed(self, ids, seq) -> "ColumnarIndex":
+        """
+        Новый снимок с перечитанными из БД продуктами ids: измененные строки заменяются на месте,
+        новые вставляются по порядку id, удаленные исключаются. Без сортировки всего снимка
+        """
+        ids = np.unique(np.fromiter(ids, dtype=np.int64))
+        fresh = self.from_rows(self.load_rows(ids.tolist()))
+
+        positions, found = self.search(self.id, ids)
+        removed = positions[found & ~np.isin(ids, fresh.id)]
+        columns = {
+            # копия колонки: текущий снимок могут читать другие запросы
+            field: np.delete(getattr(self, field), removed)
+            for field in self.FIELDS
+        }
+        positions, existing = self.search(columns["id"], fresh.id)
+        for field in self.FIELDS:
+            values = getattr(fresh, field)
+            columns[field][positions[existing]] = values[existing]
+            if not existing.all():
+                columns[field] = np.insert(
+                    columns[field], positions[~existing], values[~existing]
+                )
+        return self.__class__(columns, seq)
+
+    @staticmethod
+    def search(column, ids):
+        """
+        Позиции ids в упорядоченной колонке id и маска найденных, бинарным поиском
+        """
+        positions = np.searchsorted(column, ids)
+        found = positions < len(column)
+        found[found] = column[positions[found]] == ids[found]
+        return positions, found
+
+    def mask(
+        self,
+        min_price=None,
+        max_price=None,
+        category_ids=None,
+        product_ids=None,
+        available=False,
+        free_delivery=False,
+    ):
+        """
+        Маска продуктов, соответствующих фильтру каталога, цена - с учетом распродажи
+        """
+        mask = ~self.archived
+        if min_price is not None:
+            mask &= self.effective_price >= math.ceil(min_price * 100)
+        if max_price is not None:
+            mask &= self.effective_price <= math.floor(max_price * 100)
+        if category_ids:
+            mask &= np.isin(self.category_id, np.array(category_ids, dtype=np.int64))
+        if product_ids is not None:
+            mask &= np.isin(self.id, np.array(product_ids, dtype=np.int64))
+        if available:
+            mask &= self.count > 0
+        if free_delivery:
+            mask &= self.freeDelivery
+        return mask
+
+    @property
+    def effective_price(self):
+        """
+        Цена с учетом распродажи на текущий момент, аналог Product.effective_price_sql
+        """
+        now = int(timezone.now().timestamp() * 1_000_000)
+        on_sale = (self.dateFrom <= now) & (self.dateTo >= now)
+        return np.where(on_sale, self.salePrice, self.price)
+
+    def page(self, mask, sort, descending, page, limit):
+        """
+        id продуктов страницы и общее количество найденных продуктов.
+        Сортировка по колонке sort, при равенстве - по id
+        """
+        positions = np.flatnonzero(mask)
+        numbers = len(positions)
+        if page < 1:
+            return [], numbers
+
+        key = getattr(self, self.SORTS[sort])[positions]
+        order = np.lexsort((self.id[positions], key))
+        if descending:
+            order = order[::-1]
+        start = (page - 1) * limit
+        return self.id[positions[order[start : start + limit]]].tolist(), numbers
+
+    @staticmethod
+    def parse_price(value):
+        """
+        Граница цены фильтра, ValueError - если значение не число
+        """
+        try:
+            price = Decimal(value)
+        except InvalidOperation as ex:
+            raise ValueError(value) from ex
+        if not price.is_finite():
+            raise ValueError(value)
+        return price
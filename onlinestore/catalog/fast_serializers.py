@@ -0,0 +1,193 @@
+from django.db.models import QuerySet
+from rest_framework.fields import DateTimeField, DecimalField
+
+from .models import Image, Product
+
+ProductTag = Product.tags.through
+
+# поля DRF используются только для форматирования значений, вывод совпадает с ModelSerializer
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+DATE_FIELD = DateTimeField()
+
+
+def images_map(product_ids) -> dict:
+    """
+    Картинки продуктов одним запросом в формате ImagesSerializer: {id продукта: [{"src", "alt"}]}
+    """
+    storage = Image._meta.get_field("src").storage
+    result = {}
+    images = (
+        Image.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "id")
+        .values_list("product_id", "src", "alt")
+    )
+    for product_id, src, alt in images:
+        result.setdefault(product_id, []).append(
+            {"src": storage.url(src) if src else None, "alt": alt}
+        )
+    return result
+
+
+def tags_map(product_ids) -> dict:
+    """
+    Теги продуктов одним запросом в формате TagsSerializer: {id продукта: [{"id", "name"}]}
+    """
+    result = {}
+    tags = (
+        ProductTag.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "tag_id")
+        .values_list("product_id", "tag_id", "tag__name")
+    )
+    for product_id, tag_id, name in tags:
+        result.setdefault(product_id, []).append({"id": tag_id, "name": name})
+    return result
+
+
+class ListSerializer:
+    """
+    Сериализатор списков без ModelSerializer: строки выбираются через values(),
+    картинки и теги - одним запросом на страницу. Вывод совпадает с DRF-сериализатором,
+    который остается описанием схемы для drf_spectacular
+    """
+
+    fields = ()
+    # ключ строки с id продукта для картинок и тегов
+    product_key = "id"
+    with_tags = False
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    @classmethod
+    def rows(cls, queryset, *extra) -> QuerySet:
+        """
+        Строки для сериализации, extra - дополнительные поля (например, ключ курсорной пагинации)
+        """
+        extra = [field for field in extra if field not in (*cls.fields, "pk")]
+        return queryset.prefetch_related(None).values(*cls.fields, "pk", *extra)
+
+    @property
+    def data(self) -> list:
+        rows = self.instance
+        if isinstance(rows, QuerySet):
+            rows = self.rows(rows)
+        rows = list(rows)
+        product_ids = {row[self.product_key] for row in rows}
+        images = images_map(product_ids) if product_ids else {}
+        tags = tags_map(product_ids) if product_ids and self.with_tags else {}
+        return [
+            self.to_representation(
+                row,
+                images.get(row[self.product_key], []),
+                tags.get(row[self.product_key], []),
+            )
+            for row in rows
+        ]
+
+    def to_representation(self, row, images, tags) -> dict:
+        raise NotImplementedError
+
+
+class CatalogListSerializer(ListSerializer):
+    """
+    Аналог CatalogSerializer, цена - с учетом распродажи (Product.effective_price_sql)
+    """
+
+    fields = (
+        "id",
+        "title",
+        "description",
+        "effective_price",
+        "count",
+        "freeDelivery",
+        "date",
+        "category_id",
+        "rating",
+        "reviews_count",
+    )
+    with_tags = True
+
+    @classmethod
+    def rows(cls, queryset, *extra) -> QuerySet:
+        # каталог уже аннотирован для фильтра и сортировки по цене
+        if "effective_price" not in queryset.query.annotations:
+            queryset = queryset.annotate(effective_price=Product.effective_price_sql())
+        return super().rows(queryset, *extra)
+
+    def to_representation(self, row, images, tags) -> dict:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "description": row["description"],
+            "price": PRICE_FIELD.to_representation(row["effective_price"]),
+            "count": row["count"],
+            "freeDelivery": row["freeDelivery"],
+            "date": DATE_FIELD.to_representation(row["date"]),
+            "tags": tags,
+            "category": row["category_id"],
+            "rating": row["rating"],
+            "reviews": row["reviews_count"],
+            "images": images,
+        }
+
+
+class ProductsHomePageListSerializer(ListSerializer):
+    """
+    Аналог ProductsHomePageSerializer
+    """
+
+    fields = ("id", "title", "price", "sortIndex", "limitedEdition")
+
+    def to_representation(self, row, images, tags) -> dict:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "price": PRICE_FIELD.to_representation(row["price"]),
+            "images": images,
+            "sortIndex": row["sortIndex"],
+            "limitedEdition": row["limitedEdition"],
+        }
+
+
+class SalesListSerializer(ListSerializer):
+    """
+    Аналог SalesSerializer
+    """
+
+    fields = ("id", "title", "price", "salePrice", "dateFrom", "dateTo")
+
+    def to_representation(self, row, images, tags) -> dict:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "price": PRICE_FIELD.to_representation(row["price"]),
+            "images": images,
+            "salePrice": PRICE_FIELD.to_representation(row["salePrice"]),
+            "dateFrom": row["dateFrom"].strftime("%d-%m") if row["dateFrom"] else None,
+            "dateTo": row["dateTo"].strftime("%d-%m") if row["dateTo"] else None,
+        }
+
+
+class BasketItemListSerializer(ListSerializer):
+    """
+    Аналог BasketItemSerializer, строки - элементы корзины
+    """
+
+    fields = ("product_id", "product__title", "effective_price", "count")
+    product_key = "product_id"
+
+    @classmethod
+    def rows(cls, queryset, *extra) -> QuerySet:
+        queryset = queryset.annotate(
+            effective_price=Product.effective_price_sql("product__")
+        )
+        return super().rows(queryset, *extra)
+
+    def to_representation(self, row, images, tags) -> dict:
+        return {
+            "id": row["product_id"],
+            "title": row["product__title"],
+            "price": row["effective_price"],
+            "images": images,
+            "count": row["count"],
+        }
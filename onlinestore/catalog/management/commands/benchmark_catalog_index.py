@@ -0,0 +1,112 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.columnar_index import ColumnarIndex, np
+from catalog.models import Category, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение времени фильтрации и сортировки каталога через ORM и колоночный индекс "
+        "на синтетических продуктах (создаются в транзакции и откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("numpy is not installed")
+        user = User.objects.order_by("pk").first()
+        if user is None:
+            raise CommandError("At least one user is required")
+        categories = list(Category.objects.values_list("pk", flat=True)) or [None]
+
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.populate(size, user, categories, options["batch_size"])
+                    self.measure(size, categories, options["repeat"])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def populate(self, size, user, categories, batch_size):
+        missing = size - Product.objects.count()
+        rng = random.Random(size)
+        for start in range(0, max(missing, 0), batch_size):
+            Product.objects.bulk_create(
+                Product(
+                    title=f"Benchmark product {start + number}",
+                    price=Decimal(rng.randint(100, 10_000_000)) / 100,
+                    count=rng.randint(0, 50),
+                    freeDelivery=rng.random() < 0.3,
+                    category_id=rng.choice(categories),
+                    rating=rng.choice((None, 1.0, 2.5, 3.0, 4.5, 5.0)),
+                    reviews_count=rng.randint(0, 200),
+                    created_by=user,
+                )
+                for number in range(min(batch_size, missing - start))
+            )
+
+    def measure(self, size, categories, repeat):
+        category_ids = [pk for pk in categories[: len(categories) // 2 + 1] if pk]
+        product_filter = {
+            "archived": False,
+            "effective_price__gte": 1000,
+            "effective_price__lte": 50_000,
+            "count__gt": 0,
+            **({"category__id__in": category_ids} if category_ids else {}),
+        }
+
+        def orm():
+            products = Product.objects.annotate(
+                effective_price=Product.effective_price_sql()
+            ).filter(**product_filter)
+            products.count()
+            return list(
+                products.order_by("-effective_price").values_list("id", flat=True)[:8]
+            )
+
+        started = time.perf_counter()
+        index = ColumnarIndex.from_rows(ColumnarIndex.load_rows())
+        build = time.perf_counter() - started
+
+        def columnar():
+            mask = index.mask(
+                min_price=Decimal(1000),
+                max_price=Decimal(50_000),
+                category_ids=category_ids,
+                available=True,
+            )
+            return index.page(mask, sort="price", descending=True, page=1, limit=8)[0]
+
+        orm_time = self.best(orm, repeat)
+        columnar_time = self.best(columnar, repeat)
+        self.stdout.write(
+            f"{size:>9} products: orm {orm_time * 1000:9.2f} ms, "
+            f"columnar {columnar_time * 1000:9.2f} ms "
+            f"(x{orm_time / columnar_time:.1f}), index build {build:.2f} s"
+        )
+
+    @staticmethod
+    def best(function, repeat) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,89 @@
+import time
+from collections import Counter
+from itertools import permutations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.recommendations import CoPurchases, np
+
+
+class Command(BaseCommand):
+    help = (
+        "Время построения матрицы совместных покупок и top-K рекомендаций в зависимости "
+        "от размера истории заказов на синтетических данных (без базы данных), "
+        "в сравнении с подсчетом пар на Python"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--basket-size", type=float, default=3.0)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--python-limit",
+            type=int,
+            default=1_000_000,
+            help="подсчет на Python только для истории не больше этого количества заказов",
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("numpy is not installed")
+        top_k = settings.RECOMMENDATIONS_TOP_K
+        for size in options["sizes"]:
+            orders, products = self.generate(
+                size, options["products"], options["basket_size"]
+            )
+
+            def vectorized():
+                return CoPurchases.top(
+                    *CoPurchases.co_occurrence(orders, products), top_k
+                )
+
+            vectorized_time = self.best(vectorized, options["repeat"])
+            line = (
+                f"{size:>9} orders, {len(orders):>9} items: "
+                f"numpy {vectorized_time * 1000:10.2f} ms"
+            )
+            if size <= options["python_limit"]:
+                python_time = self.best(
+                    lambda: self.python(orders, products), options["repeat"]
+                )
+                line += (
+                    f", python {python_time * 1000:10.2f} ms "
+                    f"(x{python_time / vectorized_time:.1f})"
+                )
+            self.stdout.write(line)
+
+    @staticmethod
+    def generate(size, products_count, basket_size) -> tuple:
+        """
+        Заказы с количеством продуктов 1 + Пуассон(basket_size - 1), популярность продуктов по Ципфу
+        """
+        rng = np.random.default_rng(size)
+        sizes = 1 + rng.poisson(max(basket_size - 1, 0), size)
+        orders = np.repeat(np.arange(size, dtype=np.int64), sizes)
+        products = (rng.zipf(1.3, len(orders)) - 1) % products_count
+        return orders, products.astype(np.int64)
+
+    @staticmethod
+    def python(orders, products) -> Counter:
+        baskets = {}
+        for order, product in zip(orders.tolist(), products.tolist()):
+            baskets.setdefault(order, set()).add(product)
+        counter = Counter()
+        for basket in baskets.values():
+            counter.update(permutations(basket, 2))
+        return counter
+
+    @staticmethod
+    def best(function, repeat) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
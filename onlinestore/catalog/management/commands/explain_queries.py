@@ -0,0 +1,590 @@
+import json
+import re
+import uuid
+from contextlib import contextmanager
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import Col, OrderBy
+from django.db.models.lookups import Lookup
+from django.db.models.sql import Query
+from django.db.models.sql.compiler import SQLCompiler
+from django.db.models.sql.where import WhereNode
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.services import AuthService
+from catalog.models import Category, Product, ProductAttribute, Tag
+from catalog.services import CatalogService
+from orders.models import Order
+from orders.services import OrderService
+
+# ответы сервисов не должны браться из кэша, иначе запросы к БД не выполняются
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+ALIAS_RE = re.compile(r'"(\w+)"\s+(?:AS\s+)?([UT]\d+)\b')
+# полный проход по таблице, в том числе по индексу без условия поиска (для порядка строк)
+FULL_SCAN_RE = re.compile(
+    r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$"
+)
+TEMP_BTREE_RE = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+# литералы, кроме номеров колонок в ORDER BY/GROUP BY
+LITERAL_RE = re.compile(
+    r"'(?:[^']|'')*'|(?<!GROUP BY )\b\d+(?:\.\d+)?\b(?!\s+(?:ASC|DESC)\b)"
+)
+IN_LIST_RE = re.compile(r"IN \((?:\?, )*\?\)")
+
+# операторы условий по колонкам, которые может использовать индекс
+LOOKUP_OPS = {
+    "exact": "=",
+    "in": "IN",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<=",
+    "range": "BETWEEN",
+}
+EQUALITY_OPS = ("=", "IN", "IS NULL")
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN QUERY PLAN для запросов CatalogService, OrderService и AuthService: "
+        "поиск полных сканирований и временных B-деревьев, предложение составных индексов. "
+        "Сервисы вызываются с типичными параметрами в транзакции, которая откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=("json", "text"), default="json")
+        parser.add_argument("--output", help="Файл отчета, по умолчанию stdout")
+        parser.add_argument(
+            "--fail-on-issues",
+            action="store_true",
+            help="Код возврата 1, если найдены проблемы в планах запросов",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN is supported only for SQLite")
+
+        self.factory = APIRequestFactory()
+        shapes = {}
+        with override_settings(CACHES=NO_CACHE), transaction.atomic():
+            for name, call in self.scenarios():
+                with (
+                    CaptureQueriesContext(connection) as context,
+                    self.record_queries() as queries,
+                ):
+                    try:
+                        with transaction.atomic():
+                            call()
+                    except Http404:
+                        pass
+                for index, query in enumerate(context.captured_queries):
+                    self.collect(
+                        shapes,
+                        name,
+                        query["sql"],
+                        queries.get(context.initial_queries + index),
+                    )
+            report = self.report(shapes)
+            # все изменения сценариев откатываются
+            transaction.set_rollback(True)
+
+        if options["format"] == "json":
+            output = json.dumps(report, indent=2, ensure_ascii=False)
+        else:
+            output = self.as_text(report)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        issues = report["summary"]["issues"]
+        if options["fail_on_issues"] and issues:
+            raise CommandError(f"{issues} query plan issues found")
+
+    @staticmethod
+    @contextmanager
+    def record_queries():
+        """
+        Объекты Query запросов ORM: {номер запроса в connection.queries_log: Query}.
+        Запросы без Query (сырой SQL) в словарь не попадают
+        """
+        queries = {}
+        execute_sql = SQLCompiler.execute_sql
+
+        def recording_execute_sql(compiler, *args, **kwargs):
+            start = len(connection.queries_log)
+            try:
+                return execute_sql(compiler, *args, **kwargs)
+            finally:
+                for index in range(start, len(connection.queries_log)):
+                    queries.setdefault(index, compiler.query)
+
+        with mock.patch.object(SQLCompiler, "execute_sql", recording_execute_sql):
+            yield queries
+
+    def request(self, method="get", path="/", data=None, user=None) -> Request:
+        if method == "get":
+            wsgi_request = self.factory.get(path, data)
+        else:
+            wsgi_request = getattr(self.factory, method)(path, data, format="json")
+        SessionMiddleware(lambda request: None).process_request(wsgi_request)
+        request = Request(wsgi_request, parsers=[JSONParser()])
+        request.user = user or AnonymousUser()
+        return request
+
+    def scenarios(self) -> list:
+        """
+        Вызовы сервисов с типичными параметрами: (имя, функция)
+        """
+        user = User.objects.order_by("pk").first()
+        product = Product.objects.filter(archived=False).order_by("pk").first()
+        if user is None or product is None:
+            raise CommandError("At least one user and one product are required")
+        root = Category.objects.filter(parent__isnull=True).order_by("pk").first()
+        leaf = Category.objects.filter(parent__isnull=False).order_by("pk").first()
+        tags = [
+            str(pk)
+            for pk in Tag.objects.order_by("pk").values_list("pk", flat=True)[:2]
+        ]
+        word = (product.title.split() or ["a"])[0]
+        order = Order.objects.filter(user=user).order_by("pk").first()
+        order_id = order.pk if order else 0
+        # курсор второй страницы отзывов: отзывы старше текущего момента
+        reviews_cursor = CatalogService._encode_cursor(
+            (timezone.now(), 0), "date", "dec"
+        )
+        # фильтр по двум характеристикам: значение и диапазон числа
+        attributes = list(
+            ProductAttribute.objects.order_by("pk").values_list("name", "value")[:2]
+        ) or [("name", "value")]
+        spec_filter = {
+            f"spec[{attributes[0][0]}]": attributes[0][1],
+            f"spec[{attributes[-1][0]}][min]": "0",
+        }
+        get = self.request
+
+        def catalog(**params):
+            return lambda: CatalogService.get_catalog(get(data=params))
+
+        return [
+            ("catalog.default", catalog()),
+            ("catalog.category_root", catalog(category=str(root.pk if root else 0))),
+            ("catalog.category_leaf", catalog(category=str(leaf.pk if leaf else 0))),
+            ("catalog.tags_or", catalog(**{"tags[]": tags})),
+            ("catalog.tags_and", catalog(**{"tags[]": tags, "tagsMode": "and"})),
+            ("catalog.search", catalog(**{"filter[name]": word})),
+            (
+                "catalog.search_sort_price",
+                catalog(**{"filter[name]": word, "sort": "price"}),
+            ),
+            ("catalog.sort_rating", catalog(sort="rating", sortType="dec")),
+            ("catalog.sort_reviews", catalog(sort="reviews")),
+            ("catalog.sort_date", catalog(sort="date")),
+            (
+                "catalog.category_sort_rating",
+                catalog(category=str(leaf.pk if leaf else 0), sort="rating"),
+            ),
+            (
+                "catalog.available_free_delivery",
+                catalog(**{"filter[available]": "true", "filter[Delivery]": "true"}),
+            ),
+            ("catalog.cursor", catalog(sort="price", cursor="")),
+            ("catalog.spec", catalog(**spec_filter)),
+            (
+                "catalog.facets",
+                lambda: CatalogService.get_catalog_facets(get(data=spec_filter)),
+            ),
+            (
+                "catalog.tags",
+                lambda: CatalogService.get_tags(
+                    get(data={"category": root.pk} if root else None)
+                ),
+            ),
+            ("catalog.categories", lambda: CatalogService.get_categories()),
+            (
+                "catalog.breadcrumbs",
+                lambda: CatalogService.get_category_breadcrumbs(leaf.pk if leaf else 0),
+            ),
+            ("catalog.banners", lambda: CatalogService.get_banners()),
+            (
+                "catalog.popular",
+                lambda: CatalogService.get_products_home_page(stop=8, popular=True),
+            ),
+            (
+                "catalog.limited",
+                lambda: CatalogService.get_products_home_page(
+                    stop=16, limit_edition=True
+                ),
+            ),
+            ("catalog.sales", lambda: CatalogService.get_sales(get())),
+            (
+                "catalog.sales_cursor",
+                lambda: CatalogService.get_sales(get(data={"cursor": ""})),
+            ),
+            ("catalog.product", lambda: CatalogService.get_product(product.pk)),
+            (
+                "catalog.reviews",
+                lambda: CatalogService.get_product_reviews(get(), product.pk),
+            ),
+            (
+                "catalog.reviews_cursor",
+                lambda: CatalogService.get_product_reviews(
+                    get(data={"cursor": reviews_cursor}), product.pk
+                ),
+            ),
+            (
+                "catalog.review",
+                lambda: CatalogService.post_product_review(
+                    get(
+                        "post",
+                        data={
+                            "author": "explain",
+                            "email": "explain@example.com",
+                            "text": "explain",
+                            "rate": 5,
+                        },
+                    ),
+                    product.pk,
+                ),
+            ),
+            ("catalog.basket", lambda: CatalogService.get_basket(get(user=user))),
+            (
+                "catalog.basket_add",
+                lambda: CatalogService.add_basket(
+                    get("post", data={"id": product.pk, "count": 1}, user=user)
+                ),
+            ),
+            (
+                "catalog.basket_delete",
+                lambda: CatalogService.delete_basket(
+                    get("delete", data={"id": product.pk, "count": 1}, user=user)
+                ),
+            ),
+            ("orders.list", lambda: OrderService.get_orders(get(user=user))),
+            ("orders.get", lambda: OrderService.get_order(order_id)),
+            (
+                "orders.add",
+                lambda: OrderService.add_order(
+                    get(
+                        "post",
+                        data=[{"id": product.pk, "count": 1, "price": 1}],
+                        user=user,
+                    )
+                ),
+            ),
+            (
+                "orders.payment",
+                lambda: OrderService.make_payment(
+                    get("post", data={"number": "1"}, user=user), order_id
+                ),
+            ),
+            (
+                "accounts.sign_in",
+                lambda: AuthService.sign_in(
+                    get("post", data={"username": user.username, "password": "-"})
+                ),
+            ),
+            (
+                "accounts.sign_up",
+                lambda: AuthService.sign_up(
+                    get(
+                        "post",
+                        data={
+                            "username": f"explain-{uuid.uuid4().hex}",
+                            "password": "-",
+                        },
+                    )
+                ),
+            ),
+            ("accounts.profile", lambda: AuthService.get_profile(get(user=user))),
+        ]
+
+    @staticmethod
+    def normalize(sql) -> str:
+        """
+        Форма запроса: литералы заменены на ?, списки IN свернуты
+        """
+        shape = LITERAL_RE.sub("?", sql)
+        return IN_LIST_RE.sub("IN (...)", shape)
+
+    def collect(self, shapes, scenario, sql, query=None):
+        if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            return
+        shape = self.normalize(sql)
+        if shape in shapes:
+            if scenario not in shapes[shape]["scenarios"]:
+                shapes[shape]["scenarios"].append(scenario)
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[3] for row in cursor.fetchall()]
+        predicates = self.predicates(query)
+        order_by = self.order_by(query)
+        issues = self.issues(sql, plan, predicates)
+        # таблицы, для которых нужен индекс: полное сканирование или сортировка во временном B-дереве
+        tables = {issue["table"] for issue in issues if "table" in issue}
+        if any(issue["type"] == "temp_btree" for issue in issues):
+            tables |= {table for table, _ in order_by}
+        shapes[shape] = {
+            "scenarios": [scenario],
+            "sql": shape,
+            "plan": plan,
+            "issues": issues,
+            "indexColumns": {
+                table: columns
+                for table in sorted(tables)
+                if (columns := self.index_columns(predicates, order_by, table))
+            },
+        }
+
+    @staticmethod
+    def tables(sql) -> dict:
+        return {alias: table for table, alias in ALIAS_RE.findall(sql)}
+
+    @staticmethod
+    def predicates(query) -> list:
+        """
+        Условия фильтрации по колонкам из дерева query.where, включая подзапросы:
+        (таблица, колонка, оператор). Условия по выражениям (аннотации, CASE), сравнения
+        колонок между собой и сырой SQL индексом по колонкам не разрешаются и пропускаются
+        """
+        predicates = []
+        nodes = [query.where] if query is not None else []
+        while nodes:
+            node = nodes.pop(0)
+            if isinstance(node, WhereNode):
+                nodes.extend(node.children)
+                continue
+            if not isinstance(node, Lookup):
+                continue
+            rhs = getattr(node.rhs, "query", node.rhs)
+            if isinstance(rhs, Query):
+                nodes.append(rhs.where)
+            if not isinstance(node.lhs, Col):
+                continue
+            if node.lookup_name == "isnull":
+                op = "IS NULL" if node.rhs else "IS NOT NULL"
+            elif node.lookup_name in LOOKUP_OPS and not hasattr(
+                node.rhs, "resolve_expression"
+            ):
+                op = LOOKUP_OPS[node.lookup_name]
+            elif node.lookup_name == "in" and isinstance(rhs, Query):
+                op = "IN"
+            else:
+                continue
+            target = node.lhs.target
+            predicates.append((target.model._meta.db_table, target.column, op))
+        return predicates
+
+    @staticmethod
+    def order_by(query) -> list:
+        """
+        Колонки сортировки запроса: (таблица, колонка). Список обрывается на сортировке
+        по выражению (аннотации), такую сортировку индекс не обслуживает; pk пропускается,
+        он входит в любой индекс SQLite
+        """
+        if query is None:
+            return []
+        meta = query.get_meta()
+        ordering = query.order_by or (meta.ordering if query.default_ordering else ())
+        columns = []
+        for item in ordering:
+            if isinstance(item, OrderBy):
+                item = getattr(item.expression, "name", None)
+            if not isinstance(item, str):
+                break
+            name = item.lstrip("-")
+            if name in ("pk", meta.pk.name):
+                continue
+            annotation = query.annotations.get(name)
+            if annotation is not None:
+                if not isinstance(annotation, Col):
+                    break
+                field = annotation.target
+            else:
+                try:
+                    field = meta.get_field(name)
+                except FieldDoesNotExist:
+                    break
+            if not getattr(field, "column", None):
+                break
+            columns.append((field.model._meta.db_table, field.column))
+        return columns
+
+    @classmethod
+    def issues(cls, sql, plan, predicates) -> list:
+        """
+        Полные сканирования таблиц, у которых есть условия фильтрации, и временные B-деревья
+        """
+        filtered = {table for table, _, _ in predicates}
+        aliases = cls.tables(sql)
+        issues = []
+        for detail in plan:
+            match = FULL_SCAN_RE.match(detail)
+            if match:
+                table = aliases.get(match[1], match[1])
+                if table in filtered:
+                    issues.append(
+                        {"type": "full_scan", "table": table, "detail": detail}
+                    )
+            match = TEMP_BTREE_RE.search(detail)
+            if match:
+                issues.append(
+                    {"type": "temp_btree", "purpose": match[1], "detail": detail}
+                )
+        return issues
+
+    @staticmethod
+    def index_columns(predicates, order_by, table) -> list:
+        """
+        Колонки составного индекса для таблицы: сначала равенства, затем диапазоны,
+        при отсутствии диапазонов - колонки сортировки. id не нужен, он входит в любой индекс SQLite
+        """
+        equality, ranges = [], []
+        for predicate_table, column, op in predicates:
+            if predicate_table != table or column == "id":
+                continue
+            target = equality if op in EQUALITY_OPS else ranges
+            if column not in equality and column not in ranges:
+                target.append(column)
+        columns = equality + ranges
+        if not ranges:
+            columns += [
+                column
+                for order_table, column in order_by
+                if order_table == table and column not in columns
+            ]
+        return columns
+
+    @staticmethod
+    def existing_indexes(model) -> list:
+        """
+        Индексы таблицы модели: (колонки, колонки с равенством в условии частичного индекса)
+        """
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        conditions = {
+            index.name: index.condition
+            for index in (*model._meta.indexes, *model._meta.constraints)
+            if getattr(index, "condition", None) is not None
+        }
+        indexes = []
+        for name, constraint in constraints.items():
+            if not (
+                constraint["index"] or constraint["unique"] or constraint["primary_key"]
+            ):
+                continue
+            fixed = []
+            condition = conditions.get(name, Q())
+            if condition.connector == Q.AND and not condition.negated:
+                for child in condition.children:
+                    if isinstance(child, tuple) and "__" not in child[0]:
+                        fixed.append(model._meta.get_field(child[0]).column)
+            indexes.append((constraint["columns"], fixed))
+        return indexes
+
+    @staticmethod
+    def covered(columns, indexes) -> bool:
+        """
+        Индекс с такими же первыми колонками уже есть; колонки, зафиксированные равенством
+        в условии частичного индекса, индексу не нужны
+        """
+        for index, fixed in indexes:
+            rest = [column for column in columns if column not in fixed]
+            if (rest or fixed) and index[: len(rest)] == rest:
+                return True
+        return False
+
+    def suggestions(self, shapes) -> list:
+        models = {model._meta.db_table: model for model in apps.get_models()}
+        suggestions = {}
+        for shape in shapes.values():
+            for table, columns in shape["indexColumns"].items():
+                if table not in models:
+                    continue
+                model = models[table]
+                if self.covered(columns, self.existing_indexes(model)):
+                    continue
+                fields = {
+                    field.column: field.name for field in model._meta.concrete_fields
+                }
+                key = (table, tuple(columns))
+                suggestion = suggestions.setdefault(
+                    key,
+                    {
+                        "table": table,
+                        "model": model._meta.label,
+                        "columns": columns,
+                        "index": "models.Index(fields=[{}])".format(
+                            ", ".join(
+                                f'"{fields.get(column, column)}"' for column in columns
+                            )
+                        ),
+                        "scenarios": [],
+                    },
+                )
+                for scenario in shape["scenarios"]:
+                    if scenario not in suggestion["scenarios"]:
+                        suggestion["scenarios"].append(scenario)
+        return list(suggestions.values())
+
+    def report(self, shapes) -> dict:
+        queries = list(shapes.values())
+        suggestions = self.suggestions(shapes)
+        return {
+            "summary": {
+                "queries": len(queries),
+                "issues": sum(len(query["issues"]) for query in queries),
+                "fullScans": sum(
+                    issue["type"] == "full_scan"
+                    for query in queries
+                    for issue in query["issues"]
+                ),
+                "tempBtrees": sum(
+                    issue["type"] == "temp_btree"
+                    for query in queries
+                    for issue in query["issues"]
+                ),
+                "suggestions": len(suggestions),
+            },
+            "queries": queries,
+            "suggestions": suggestions,
+        }
+
+    @staticmethod
+    def as_text(report) -> str:
+        lines = []
+        for query in report["queries"]:
+            if not query["issues"]:
+                continue
+            lines.append(", ".join(query["scenarios"]))
+            lines.append(f"  {query['sql']}")
+            lines.extend(f"    {detail}" for detail in query["plan"])
+            lines.extend(f"  ! {issue['detail']}" for issue in query["issues"])
+        lines.append("Suggested indexes:")
+        lines.extend(
+            f"  {item['model']}: {item['index']}  ({', '.join(item['scenarios'])})"
+            for item in report["suggestions"]
+        )
+        lines.append(
+            "{queries} query shapes, {issues} issues "
+            "({fullScans} full scans, {tempBtrees} temp B-trees), "
+            "{suggestions} suggested indexes".format(**report["summary"])
+        )
+        return "\n".join(lines)
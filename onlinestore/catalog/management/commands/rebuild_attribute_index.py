@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import CatalogCache
+from catalog.models import ProductAttribute
+
+
+class Command(BaseCommand):
+    help = "Перестроение индекса характеристик продуктов для фильтров и фасетов каталога"
+
+    def handle(self, *args, **options):
+        ProductAttribute.refresh()
+        CatalogCache.bump("specification")
+        total = ProductAttribute.objects.count()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} specifications"))
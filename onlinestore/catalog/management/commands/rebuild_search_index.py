@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import ProductSearch
+
+
+class Command(BaseCommand):
+    help = "Перестроение полнотекстового индекса продуктов (SQLite FTS5)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not ProductSearch.is_available():
+            self.stderr.write("Full-text index is supported only for SQLite")
+            return
+        total = ProductSearch.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products"))
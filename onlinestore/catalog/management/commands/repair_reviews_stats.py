@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import CatalogCache
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = "Пересчет рейтинга и количества отзывов продуктов по таблице отзывов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Product.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            Product.update_reviews_stats(ids)
+            total += len(ids)
+            last_id = ids[-1]
+        CatalogCache.bump("review")
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {total} products"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.recommendations import CoPurchases, np
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет рекомендаций "с этим товаром покупают" по оформленным заказам: '
+        "инкрементально для продуктов из новых заказов или полностью (--full)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true")
+        parser.add_argument("--top-k", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("numpy is not installed")
+        started = time.perf_counter()
+        if options["full"]:
+            products = "all"
+            rows = CoPurchases.rebuild(
+                top_k=options["top_k"], batch_size=options["batch_size"]
+            )
+        else:
+            products, rows = CoPurchases.update(
+                top_k=options["top_k"], batch_size=options["batch_size"]
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed recommendations of {products} products: {rows} rows "
+                f"in {time.perf_counter() - started:.2f} s"
+            )
+        )
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:13
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_reviews_stats(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Review = apps.get_model("catalog", "Review")
+    reviews = Review.objects.filter(product_id=OuterRef("pk")).values("product_id")
+    Product.objects.update(
+        rating=Subquery(reviews.annotate(avg=Avg("rate")).values("avg")),
+        reviews_count=Coalesce(
+            Subquery(reviews.annotate(count=Count("id")).values("count")), Value(0)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0023_product_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating",
+            field=models.FloatField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_reviews_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def fill_category_price_stats(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    CategoryPriceStats = apps.get_model("catalog", "CategoryPriceStats")
+    rows = (
+        Product.objects.filter(archived=False, category__isnull=False)
+        .order_by()
+        .values("category_id")
+        .annotate(
+            min_price=Min("price"), max_price=Max("price"), products_count=Count("id")
+        )
+    )
+    CategoryPriceStats.objects.bulk_create(CategoryPriceStats(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0024_product_rating_reviews_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryPriceStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="price_stats",
+                        serialize=False,
+                        to="catalog.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        db_index=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        verbose_name="Минимальная цена",
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=12,
+                        verbose_name="Максимальная цена",
+                    ),
+                ),
+                (
+                    "products_count",
+                    models.PositiveIntegerField(verbose_name="Количество продуктов"),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика цен категории",
+                "verbose_name_plural": "Статистика цен категорий",
+            },
+        ),
+        migrations.RunPython(fill_category_price_stats, migrations.RunPython.noop),
+    ]
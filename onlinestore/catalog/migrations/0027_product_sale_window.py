@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0026_product_popularity"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["dateFrom", "dateTo"],
+                name="catalog_product_sale_window",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    Review = apps.get_model("catalog", "Review")
+    histograms = {}
+    rates = (
+        Review.objects.order_by()
+        .values_list("product_id", "rate")
+        .annotate(count=Count("id"))
+    )
+    for product_id, rate, count in rates:
+        if 1 <= rate <= 5:
+            histograms.setdefault(product_id, [0] * 5)[rate - 1] = count
+    Product.objects.update(rating_histogram=[0] * 5)
+    for product_id, histogram in histograms.items():
+        Product.objects.filter(id=product_id).update(rating_histogram=histogram)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0027_product_sale_window"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_histogram",
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "date"], name="catalog_review_product_date"
+            ),
+        ),
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0028_review_pagination"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="co_purchases_stale",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("co_purchases_stale", True)),
+                fields=["id"],
+                name="catalog_product_stale_copurch",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productrecommendation",
+            name="product",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recommendations",
+                to="catalog.product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productrecommendation",
+            name="recommended",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="catalog.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productrecommendation",
+            index=models.Index(
+                fields=["product", "-count", "recommended"],
+                name="catalog_recommendation_rank",
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:50
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+NUMBER_RE = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+
+def fill_attributes(apps, schema_editor):
+    Specification = apps.get_model("catalog", "Specification")
+    ProductAttribute = apps.get_model("catalog", "ProductAttribute")
+    attributes = []
+    for specification in Specification.objects.iterator():
+        value = " ".join(specification.value.split())
+        match = NUMBER_RE.match(value)
+        attributes.append(
+            ProductAttribute(
+                specification_id=specification.pk,
+                product_id=specification.product_id,
+                name=" ".join(specification.name.split()),
+                value=value,
+                number=float(match.group().replace(",", ".")) if match else None,
+            )
+        )
+    ProductAttribute.objects.bulk_create(attributes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0029_product_recommendation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductAttribute",
+            fields=[
+                (
+                    "specification",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="attribute",
+                        serialize=False,
+                        to="catalog.specification",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("value", models.CharField(max_length=100)),
+                ("number", models.FloatField(null=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attributes",
+                        to="catalog.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["name", "value", "product"],
+                        name="catalog_attribute_value",
+                    ),
+                    models.Index(
+                        fields=["name", "number", "product"],
+                        name="catalog_attribute_number",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_baskets(apps, schema_editor):
+    """
+    Слияние корзин пользователя в самую раннюю: количества одинаковых продуктов складываются
+    """
+    Basket = apps.get_model("catalog", "Basket")
+    BasketItem = apps.get_model("catalog", "BasketItem")
+    duplicates = (
+        Basket.objects.values("user_id")
+        .annotate(baskets=Count("id"), kept=Min("id"))
+        .filter(baskets__gt=1)
+    )
+    for row in duplicates:
+        baskets = Basket.objects.filter(user_id=row["user_id"]).exclude(pk=row["kept"])
+        counts = {}
+        for product_id, count in BasketItem.objects.filter(
+            basket__user_id=row["user_id"]
+        ).values_list("product_id", "count"):
+            counts[product_id] = counts.get(product_id, 0) + count
+        baskets.delete()
+        BasketItem.objects.filter(basket_id=row["kept"]).delete()
+        BasketItem.objects.bulk_create(
+            BasketItem(basket_id=row["kept"], product_id=product_id, count=count)
+            for product_id, count in counts.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0030_product_attribute"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_baskets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="basket",
+            constraint=models.UniqueConstraint(
+                fields=("user",), name="catalog_basket_unique_user"
+            ),
+        ),
+    ]
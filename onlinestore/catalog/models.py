@@ -1,4 +1,6 @@
 import os
+import re
+from datetime import datetime, timezone as dt_timezone
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models import (
@@ -10,19 +12,42 @@ from django.db.models import (
     BooleanField,
     ForeignKey,
     ManyToManyField,
+    OneToOneField,
     ImageField,
     PROTECT,
     CASCADE,
     Model,
     EmailField,
     PositiveIntegerField,
+    FloatField,
+    Index,
+    JSONField,
+    Avg,
+    Case,
+    Count,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    UniqueConstraint,
+    Value,
+    When,
 )
+from django.db.models.functions import Coalesce
+from django.conf import settings
 
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
 
 
 curr_dir = os.getcwd()
+# точка отсчета весов популярности, см. Product.popularity_weight
+POPULARITY_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# число в начале значения характеристики: "16 ГБ", "14.1\"", "1,5 м"
+ATTRIBUTE_NUMBER_RE = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
 
 
 def clear_uploads(path, inst):
@@ -109,6 +134,12 @@ class Category(Model):
         verbose_name_plural = "Категории"
 
     def __str__(self):
+        # название родителя берется из снимка дерева категорий, без запроса к БД
+        from .category_tree import CategoryTree
+
+        parent = CategoryTree.get().nodes.get(self.parent_id)
+        if parent:
+            return f"{parent['title']} → {self.title}"
         if self.parent:
             return f"{self.parent.title} → {self.title}"
         return self.title
@@ -147,6 +178,15 @@ class Product(Model):
     date = DateTimeField(auto_now_add=True)
     created_by = ForeignKey(User, on_delete=PROTECT, editable=False)
     archived = BooleanField(default=False)
+    # денормализованные данные отзывов, пересчитываются при изменении Review
+    rating = FloatField(null=True, blank=True, editable=False, db_index=True)
+    reviews_count = PositiveIntegerField(default=0, editable=False, db_index=True)
+    # количество отзывов с оценками 1-5
+    rating_histogram = JSONField(default=list, editable=False)
+    # популярность по заказам с затуханием во времени, пересчитывается при оформлении заказа
+    popularity = FloatField(default=0, editable=False, db_index=True)
+    # продукт есть в заказах, оформленных после последнего пересчета рекомендаций (CoPurchases)
+    co_purchases_stale = BooleanField(default=False, editable=False)
     tags = ManyToManyField("Tag", related_name="products")
     category = ForeignKey(
         Category,
@@ -158,15 +198,211 @@ class Product(Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            # окно распродажи не архивных продуктов: выборка активных распродаж и границ окон (ActiveSales).
+            # Частичный индекс: SQLite не использует archived в составном индексе для условия NOT archived
+            Index(
+                fields=["dateFrom", "dateTo"],
+                condition=Q(archived=False),
+                name="catalog_product_sale_window",
+            ),
+            # продукты для инкрементального пересчета рекомендаций
+            Index(
+                fields=["id"],
+                condition=Q(co_purchases_stale=True),
+                name="catalog_product_stale_copurch",
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
-    def get_current_price(self):
-        now = timezone.now()
-        if self.dateFrom and self.dateTo:
-            if self.dateFrom <= now and self.dateTo >= now:
-                return self.salePrice
-        return self.price
+    @classmethod
+    def update_reviews_stats(cls, ids):
+        """
+        Пересчет рейтинга, количества отзывов и гистограммы оценок продуктов одним UPDATE по таблице Review,
+        гистограмма - по группировке отзывов (product_id, rate)
+        """
+        from .columnar_index import ProductFeed
+
+        ids = list(ids)
+        histograms = {pk: [0] * 5 for pk in ids}
+        rates = (
+            Review.objects.filter(product_id__in=ids)
+            .order_by()
+            .values_list("product_id", "rate")
+            .annotate(count=Count("id"))
+        )
+        for product_id, rate, count in rates:
+            if 1 <= rate <= 5:
+                histograms[product_id][rate - 1] = count
+
+        reviews = Review.objects.filter(product_id=OuterRef("pk")).values("product_id")
+        cls.objects.filter(id__in=ids).update(
+            rating=Subquery(reviews.annotate(avg=Avg("rate")).values("avg")),
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(count=Count("id")).values("count")),
+                Value(0),
+            ),
+            rating_histogram=Case(
+                *[
+                    When(id=pk, then=Value(histogram, output_field=JSONField()))
+                    for pk, histogram in histograms.items()
+                ],
+                default=Value([0] * 5, output_field=JSONField()),
+            ),
+        )
+        ProductFeed.publish(ids)
+
+    @staticmethod
+    def popularity_weight(at) -> float:
+        """
+        Вес единицы товара в заказе, оформленном в момент at: 2^((at - POPULARITY_EPOCH) / период полураспада).
+        Вместо уменьшения всех оценок со временем растет вес новых заказов: порядок продуктов тот же,
+        что при экспоненциальном затухании, а заказ обновляет только свои продукты.
+        При периоде полураспада 30 дней float не переполнится ~80 лет
+        """
+        half_life = settings.POPULARITY_HALF_LIFE_DAYS * 86400
+        return 2 ** ((at - POPULARITY_EPOCH).total_seconds() / half_life)
+
+    @classmethod
+    def add_popularity(cls, items):
+        """
+        Инкрементальное обновление популярности одним UPDATE, items - тройки (id продукта, количество, дата заказа)
+        """
+        from .cache import CatalogCache
+        from .columnar_index import ProductFeed
+
+        scores = {}
+        for product_id, count, at in items:
+            score = count * cls.popularity_weight(at)
+            scores[product_id] = scores.get(product_id, 0) + score
+        if not scores:
+            return
+        cls.objects.filter(id__in=scores).update(
+            popularity=F("popularity")
+            + Case(
+                *[When(id=pk, then=Value(score)) for pk, score in scores.items()],
+                default=Value(0.0),
+            )
+        )
+        ProductFeed.publish(scores)
+        CatalogCache.bump("popularity")
+
+    @classmethod
+    def update_popularity(cls, ids):
+        """
+        Пересчет популярности продуктов ids по истории оформленных заказов
+        """
+        from orders.models import OrderProduct, PLACED_STATUSES
+        from .columnar_index import ProductFeed
+
+        ids = list(ids)
+        scores = dict.fromkeys(ids, 0.0)
+        items = OrderProduct.objects.filter(
+            product_id__in=ids, order__status__in=PLACED_STATUSES
+        ).values_list("product_id", "count", "order__createdAt")
+        for product_id, count, at in items.iterator(chunk_size=10_000):
+            scores[product_id] += count * cls.popularity_weight(at)
+        cls.objects.filter(id__in=ids).update(
+            popularity=Case(
+                *[When(id=pk, then=Value(score)) for pk, score in scores.items()],
+                default=Value(0.0),
+            )
+        )
+        ProductFeed.publish(ids)
+
+    @staticmethod
+    def effective_price_sql(prefix="", now=None) -> Case:
+        """
+        Выражение для annotate: цена, которую платит покупатель - цена распродажи, если сейчас
+        dateFrom <= now <= dateTo, иначе обычная цена. prefix - путь к продукту от модели запроса,
+        например "product__" для BasketItem
+        """
+        now = now or timezone.now()
+        return Case(
+            When(
+                **{f"{prefix}dateFrom__lte": now, f"{prefix}dateTo__gte": now},
+                then=F(f"{prefix}salePrice"),
+            ),
+            default=F(f"{prefix}price"),
+            output_field=DecimalField(decimal_places=2, max_digits=12),
+        )
+
+
+class CategoryPriceStats(Model):
+    """
+    Материализованная статистика цен не архивных продуктов категории: минимальная и максимальная цена,
+    количество продуктов. Пересчитывается при изменении продуктов (сигналы, действия админки)
+    """
+
+    category = OneToOneField(
+        Category,
+        on_delete=CASCADE,
+        primary_key=True,
+        related_name="price_stats",
+        verbose_name="Категория",
+    )
+    min_price = DecimalField(
+        "Минимальная цена", decimal_places=2, max_digits=12, db_index=True
+    )
+    max_price = DecimalField("Максимальная цена", decimal_places=2, max_digits=12)
+    products_count = PositiveIntegerField("Количество продуктов")
+
+    class Meta:
+        verbose_name = "Статистика цен категории"
+        verbose_name_plural = "Статистика цен категорий"
+
+    @classmethod
+    def refresh(cls, category_ids=None):
+        """
+        Пересчет статистики категорий (по умолчанию всех) одним запросом с группировкой по категории
+        """
+        products = Product.objects.filter(archived=False, category__isnull=False)
+        stats = cls.objects.all()
+        if category_ids is not None:
+            category_ids = {pk for pk in category_ids if pk is not None}
+            if not category_ids:
+                return
+            products = products.filter(category_id__in=category_ids)
+            stats = stats.filter(category_id__in=category_ids)
+
+        rows = (
+            products.order_by()
+            .values("category_id")
+            .annotate(
+                min_price=Min("price"),
+                max_price=Max("price"),
+                products_count=Count("id"),
+            )
+        )
+        with transaction.atomic():
+            stats.delete()
+            cls.objects.bulk_create(cls(**row) for row in rows)
+
+
+class ProductRecommendation(Model):
+    """
+    Рекомендация "с этим товаром покупают": продукт recommended встречается в count оформленных
+    заказах вместе с product. Для каждого продукта хранятся RECOMMENDATIONS_TOP_K продуктов
+    с наибольшим count, таблица пересчитывается пакетно (CoPurchases)
+    """
+
+    product = ForeignKey(
+        Product, on_delete=CASCADE, related_name="recommendations", db_index=False
+    )
+    recommended = ForeignKey(Product, on_delete=CASCADE, related_name="+")
+    count = PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # рекомендации продукта по убыванию count, при равенстве - по id рекомендуемого продукта
+            Index(
+                fields=["product", "-count", "recommended"],
+                name="catalog_recommendation_rank",
+            ),
+        ]
 
 
 class Image(Model):
@@ -191,6 +427,12 @@ class Review(Model):
     rate = SmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     date = DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # последние отзывы продукта и курсорная пагинация по (date, id)
+            Index(fields=["product", "date"], name="catalog_review_product_date"),
+        ]
+
 
 class Specification(Model):
     product = ForeignKey(Product, on_delete=PROTECT)
@@ -201,9 +443,74 @@ class Specification(Model):
         return f"{self.name}: {self.value}"
 
 
+class ProductAttribute(Model):
+    """
+    Нормализованный индекс характеристик (Specification) для фильтров и фасетов каталога:
+    название и значение без лишних пробелов, число в начале значения в отдельной колонке
+    ("16 ГБ" -> 16, "14.1\"" -> 14.1) для фильтров по диапазону.
+    Строка на каждую характеристику, синхронизируется сигналом сохранения Specification
+    """
+
+    specification = OneToOneField(
+        Specification, on_delete=CASCADE, primary_key=True, related_name="attribute"
+    )
+    product = ForeignKey(Product, on_delete=CASCADE, related_name="attributes")
+    name = CharField(max_length=100)
+    value = CharField(max_length=100)
+    number = FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            # фильтр по значению и по диапазону числа: продукты берутся из индекса без чтения таблицы
+            Index(fields=["name", "value", "product"], name="catalog_attribute_value"),
+            Index(
+                fields=["name", "number", "product"], name="catalog_attribute_number"
+            ),
+        ]
+
+    @staticmethod
+    def parse_number(value) -> float | None:
+        match = ATTRIBUTE_NUMBER_RE.match(value)
+        return float(match.group().replace(",", ".")) if match else None
+
+    @classmethod
+    def from_specification(cls, specification) -> "ProductAttribute":
+        value = " ".join(specification.value.split())
+        return cls(
+            specification_id=specification.pk,
+            product_id=specification.product_id,
+            name=" ".join(specification.name.split()),
+            value=value,
+            number=cls.parse_number(value),
+        )
+
+    @classmethod
+    def refresh(cls, specification_ids=None):
+        """
+        Пересчет индекса характеристик (по умолчанию всех)
+        """
+        specifications = Specification.objects.all()
+        attributes = cls.objects.all()
+        if specification_ids is not None:
+            specifications = specifications.filter(pk__in=specification_ids)
+            attributes = attributes.filter(pk__in=specification_ids)
+        with transaction.atomic():
+            attributes.delete()
+            cls.objects.bulk_create(
+                (cls.from_specification(item) for item in specifications.iterator()),
+                batch_size=1000,
+            )
+
+
 class Basket(Model):
     user = ForeignKey(User, on_delete=CASCADE)
 
+    class Meta:
+        constraints = [
+            # одна корзина на пользователя: get_or_create корзины не создает дубликаты при параллельных запросах
+            UniqueConstraint(fields=["user"], name="catalog_basket_unique_user"),
+        ]
+
 
 class BasketItem(Model):
     basket = ForeignKey(Basket, on_delete=CASCADE, related_name="items")
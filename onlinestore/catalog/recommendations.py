@@ -0,0 +1,178 @@
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import CatalogCache
+from .models import Product, ProductRecommendation
+
+try:
+    import numpy as np
+except ImportError:  # рекомендации не пересчитываются, продукт отдается без них
+    np = None
+
+# ограничение количества пар (продукт, продукт) в памяти при построении матрицы
+MAX_PAIRS = 5_000_000
+
+
+class CoPurchases:
+    """
+    Рекомендации "с этим товаром покупают" по истории оформленных заказов.
+    Разреженная матрица совместных покупок продукт x продукт строится векторно на numpy
+    (аналог X.T @ X для матрицы заказ x продукт): пары продуктов внутри заказов генерируются
+    порциями до MAX_PAIRS и суммируются по ключу. Для каждого продукта в ProductRecommendation
+    сохраняются top_k соседей с наибольшим количеством общих заказов.
+    Строка продукта зависит только от заказов с этим продуктом, поэтому инкрементальный пересчет
+    затрагивает только продукты из новых заказов (Product.co_purchases_stale)
+    """
+
+    @staticmethod
+    def co_occurrence(orders, products, rows=None, max_pairs=MAX_PAIRS) -> tuple:
+        """
+        Матрица совместных покупок в формате COO: массивы (продукт, сосед, количество заказов),
+        упорядоченные по продукту и соседу, без диагонали. orders, products - пары (заказ, продукт),
+        rows - продукты, для которых нужны строки матрицы (по умолчанию все)
+        """
+        product_ids, product_codes = np.unique(products, return_inverse=True)
+        _, order_codes = np.unique(orders, return_inverse=True)
+        width = len(product_ids)
+        # пары (заказ, продукт) без повторов, упорядоченные по заказу;
+        # сортировка быстрее np.unique, который в numpy 2 для int64 использует хэш-таблицу
+        keys = np.sort(order_codes.astype(np.int64) * width + product_codes)
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        order_codes, product_codes = np.divmod(keys, width)
+        sizes = np.bincount(order_codes)
+        starts = np.cumsum(sizes) - sizes
+
+        left = (
+            np.arange(len(keys))
+            if rows is None
+            else np.flatnonzero(np.isin(product_ids[product_codes], rows))
+        )
+        repeats = sizes[order_codes[left]]
+        ends = np.cumsum(repeats)
+        chunks_keys, chunks_counts = [], []
+        start = 0
+        while start < len(left):
+            # порция записей, для которых количество пар не больше max_pairs (минимум одна запись)
+            offset = ends[start] - repeats[start]
+            end = max(
+                int(np.searchsorted(ends, offset + max_pairs, side="right")), start + 1
+            )
+            entries, counts = left[start:end], repeats[start:end]
+            first = np.repeat(entries, counts)
+            shift = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            second = np.repeat(starts[order_codes[entries]], counts) + shift
+            a, b = product_codes[first], product_codes[second]
+            pairs = a != b
+            chunk_keys, chunk_counts = np.unique(
+                a[pairs] * width + b[pairs], return_counts=True
+            )
+            chunks_keys.append(chunk_keys)
+            chunks_counts.append(chunk_counts)
+            start = end
+
+        if not chunks_keys:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        if len(chunks_keys) == 1:
+            pair_keys, pair_counts = chunks_keys[0], chunks_counts[0]
+        else:
+            pair_keys, inverse = np.unique(
+                np.concatenate(chunks_keys), return_inverse=True
+            )
+            pair_counts = np.bincount(inverse, weights=np.concatenate(chunks_counts))
+        a, b = np.divmod(pair_keys, width)
+        return product_ids[a], product_ids[b], pair_counts.astype(np.int64)
+
+    @staticmethod
+    def top(a, b, counts, top_k) -> tuple:
+        """
+        top_k соседей каждого продукта по убыванию количества заказов, при равенстве - по id соседа
+        """
+        order = np.lexsort((b, -counts, a))
+        a, b, counts = a[order], b[order], counts[order]
+        positions = np.arange(len(a))
+        first = np.r_[True, a[1:] != a[:-1]] if len(a) else np.empty(0, dtype=bool)
+        rank = positions - np.maximum.accumulate(np.where(first, positions, 0))
+        keep = rank < top_k
+        return a[keep], b[keep], counts[keep]
+
+    @staticmethod
+    def load_pairs(product_ids=None):
+        """
+        Пары (заказ, продукт) оформленных заказов; для product_ids - только заказов с этими продуктами
+        """
+        from orders.models import OrderProduct, PLACED_STATUSES
+
+        items = OrderProduct.objects.filter(order__status__in=PLACED_STATUSES)
+        if product_ids is not None:
+            items = items.filter(
+                order__in=OrderProduct.objects.filter(
+                    product_id__in=product_ids
+                ).values("order_id")
+            )
+        rows = items.order_by().values_list("order_id", "product_id")
+        pairs = np.fromiter(
+            chain.from_iterable(rows.iterator(chunk_size=10_000)), dtype=np.int64
+        ).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    @classmethod
+    def rebuild(cls, product_ids=None, top_k=None, batch_size=1000) -> int:
+        """
+        Пересчет рекомендаций всех продуктов (с отметками co_purchases_stale) или только product_ids,
+        возвращает количество строк
+        """
+        top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+        if product_ids is None:
+            Product.objects.filter(co_purchases_stale=True).update(
+                co_purchases_stale=False
+            )
+        else:
+            product_ids = sorted(set(product_ids))
+            if not product_ids:
+                return 0
+        orders, products = cls.load_pairs(product_ids)
+        if len(orders):
+            a, b, counts = cls.top(
+                *cls.co_occurrence(orders, products, rows=product_ids), top_k
+            )
+        else:
+            a = b = counts = []
+
+        recommendations = ProductRecommendation.objects.all()
+        if product_ids is not None:
+            recommendations = recommendations.filter(product_id__in=product_ids)
+        with transaction.atomic():
+            recommendations.delete()
+            ProductRecommendation.objects.bulk_create(
+                (
+                    ProductRecommendation(
+                        product_id=int(product),
+                        recommended_id=int(neighbour),
+                        count=int(count),
+                    )
+                    for product, neighbour, count in zip(a, b, counts)
+                ),
+                batch_size=batch_size,
+            )
+        CatalogCache.bump("productrecommendation")
+        return len(a)
+
+    @classmethod
+    def update(cls, top_k=None, batch_size=1000) -> tuple:
+        """
+        Инкрементальный пересчет рекомендаций продуктов из заказов, оформленных после прошлого пересчета.
+        Отметка снимается до пересчета: заказ, оформленный во время пересчета, снова отметит продукты.
+        Возвращает количество продуктов и строк рекомендаций
+        """
+        product_ids = list(
+            Product.objects.filter(co_purchases_stale=True).values_list("pk", flat=True)
+        )
+        if not product_ids:
+            return 0, 0
+        Product.objects.filter(pk__in=product_ids).update(co_purchases_stale=False)
+        return len(product_ids), cls.rebuild(product_ids, top_k, batch_size)
@@ -0,0 +1,123 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+FTS_TABLE = "catalog_product_fts"
+FTS_COLUMNS = ("title", "description", "fullDescription")
+
+
+class ProductSearch:
+    """
+    Полнотекстовый поиск продуктов по индексу SQLite FTS5 (title, description, fullDescription).
+    rowid индекса совпадает с id продукта, индекс поддерживается сигналами моделей и действиями админки
+    """
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return connection.vendor == "sqlite"
+
+    @staticmethod
+    def match_query(text) -> str:
+        """
+        Преобразование пользовательского ввода в выражение MATCH: каждое слово - префиксный поиск,
+        слова объединяются по AND. Пустая строка - если слов нет
+        """
+        words = re.findall(r"\w+", text or "")
+        return " ".join(f'"{word}"*' for word in words)
+
+    @classmethod
+    def filter(cls, text) -> dict:
+        """
+        Условие фильтрации продуктов для DAO.search_object_by_fields
+        """
+        query = cls.match_query(text)
+        if not query:
+            return {}
+        if not cls.is_available():
+            return {"title__iregex": text}
+        return {
+            "id__in": RawSQL(
+                f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s',
+                (query,),
+            )
+        }
+
+    @classmethod
+    def relevance(cls, text):
+        """
+        Аннотация релевантности BM25 (чем меньше значение, тем выше релевантность).
+        Подзапрос ищет по rowid, поэтому вычисляется только для найденных продуктов
+        """
+        return RawSQL(
+            f'SELECT rank FROM "{FTS_TABLE}" '
+            f'WHERE "{FTS_TABLE}" MATCH %s AND rowid = "catalog_product"."id"',
+            (cls.match_query(text),),
+        )
+
+    @classmethod
+    def index_products(cls, ids):
+        """
+        Добавление/обновление продуктов в индексе
+        """
+        ids = list(ids)
+        if not ids or not cls.is_available():
+            return
+        rows = Product.objects.filter(id__in=ids).values_list("id", *FTS_COLUMNS)
+        columns = ", ".join(f'"{column}"' for column in FTS_COLUMNS)
+        with connection.cursor() as cursor:
+            cls._delete(cursor, ids)
+            cursor.executemany(
+                f'INSERT INTO "{FTS_TABLE}" (rowid, {columns}) VALUES (%s, %s, %s, %s)',
+                list(rows),
+            )
+
+    @classmethod
+    def remove_products(cls, ids):
+        """
+        Удаление продуктов из индекса
+        """
+        ids = list(ids)
+        if not ids or not cls.is_available():
+            return
+        with connection.cursor() as cursor:
+            cls._delete(cursor, ids)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000) -> int:
+        """
+        Полное перестроение индекса пакетами по batch_size продуктов, возвращает количество продуктов
+        """
+        if not cls.is_available():
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+
+        total = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Product.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            cls.index_products(ids)
+            total += len(ids)
+            last_id = ids[-1]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO \"{FTS_TABLE}\" ({FTS_TABLE}) VALUES ('optimize')"
+            )
+        return total
+
+    @staticmethod
+    def _delete(cursor, ids):
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f'DELETE FROM "{FTS_TABLE}" WHERE rowid IN ({placeholders})', ids
+        )
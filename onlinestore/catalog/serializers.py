@@ -1,4 +1,3 @@
-from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework.serializers import (
@@ -7,7 +6,10 @@ from rest_framework.serializers import (
     FloatField,
     SerializerMethodField,
     CharField,
+    DecimalField,
     Serializer,
+    ChoiceField,
+    ValidationError,
 )
 
 from .models import (
@@ -16,9 +18,11 @@ from .models import (
     Review,
     Image,
     Category,
+    CategoryPriceStats,
     Specification,
     BasketItem,
 )
+from .category_tree import CategoryTree
 
 
 class ErrorSerializer(Serializer):
@@ -55,7 +59,11 @@ class SpecificationSerializer(ModelSerializer):
 
 class CatalogSerializer(ModelSerializer):
     tags = TagsSerializer(many=True, read_only=True)
-    reviews = IntegerField(read_only=True)  # количество отзывов
+    # цена с учетом распродажи, аннотация Product.effective_price_sql
+    price = DecimalField(
+        source="effective_price", max_digits=12, decimal_places=2, read_only=True
+    )
+    reviews = IntegerField(source="reviews_count", read_only=True)  # количество отзывов
     rating = FloatField(read_only=True)  # средний рейтинг
     images = ImagesSerializer(many=True, source="image_set", read_only=True)
 
@@ -78,7 +86,7 @@ class CatalogSerializer(ModelSerializer):
 
 
 class ProductSerializer(ModelSerializer):
-    reviews = ReviewsSerializer(many=True, source="review_set", read_only=True)
+    reviews = ReviewsSerializer(many=True, source="latest_reviews", read_only=True)
     rating = FloatField(read_only=True)
     images = ImagesSerializer(many=True, source="image_set", read_only=True)
     tags = SerializerMethodField()
@@ -86,6 +94,8 @@ class ProductSerializer(ModelSerializer):
         many=True, source="specification_set", read_only=True
     )
     price = SerializerMethodField()
+    ratingHistogram = SerializerMethodField()
+    alsoBought = SerializerMethodField()
 
     class Meta:
         model = Product
@@ -101,9 +111,11 @@ class ProductSerializer(ModelSerializer):
             "tags",
             "category",
             "rating",
+            "ratingHistogram",
             "reviews",
             "images",
             "specifications",
+            "alsoBought",
         )
 
     @extend_schema_field(OpenApiTypes.OBJECT)
@@ -115,11 +127,19 @@ class ProductSerializer(ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_price(self, obj):
-        now = timezone.now()
-        if obj.dateFrom and obj.dateTo:
-            if obj.dateFrom <= now and obj.dateTo >= now:
-                return obj.salePrice
-        return obj.price
+        # аннотация Product.effective_price_sql
+        return obj.effective_price
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_ratingHistogram(self, obj):
+        # количество отзывов по оценкам: {"1": ..., "5": ...}
+        histogram = obj.rating_histogram or [0] * 5
+        return {str(rate): count for rate, count in enumerate(histogram, start=1)}
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_alsoBought(self, obj):
+        # id продуктов "с этим товаром покупают", карточки - через /api/products/?ids=...&shape=list
+        return [item.recommended_id for item in obj.also_bought]
 
 
 class SubcategoriesSerializer(ModelSerializer):
@@ -152,16 +172,24 @@ class CategoriesSerializer(ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_subcategories(self, obj):
-        result = Category.objects.filter(parent_id=obj.pk).all()
-        return SubcategoriesSerializer(result, many=True).data
+        return CategoryTree.get().subcategories(obj.pk)
+
+
+class CategoryBreadcrumbSerializer(ModelSerializer):
+    class Meta:
+        model = Category
+        fields = "id", "title"
 
 
 class BannerSerializer(ModelSerializer):
     images = SerializerMethodField()
-    title = SerializerMethodField()
+    title = CharField(source="category.title", read_only=True)
+    price = DecimalField(
+        source="min_price", max_digits=12, decimal_places=2, read_only=True
+    )
 
     class Meta:
-        model = Product
+        model = CategoryPriceStats
         fields = (
             "category",
             "title",
@@ -169,13 +197,9 @@ class BannerSerializer(ModelSerializer):
             "images",
         )
 
-    @extend_schema_field(OpenApiTypes.OBJECT)
-    def get_title(self, obj):
-        return obj.category.title if obj.category else None
-
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_images(self, obj):
-        if obj.category:
+        if obj.category.image:
             return [{"src": obj.category.image.url, "alt": obj.category.title}]
         return None
 
@@ -207,11 +231,8 @@ class BasketItemSerializer(ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_price(self, obj):
-        now = timezone.now()
-        if obj.product.dateFrom and obj.product.dateTo:
-            if obj.product.dateFrom <= now and obj.product.dateTo >= now:
-                return obj.product.salePrice
-        return obj.product.price
+        # аннотация Product.effective_price_sql("product__")
+        return obj.effective_price
 
 
 class AddDeleteBasketSerializer(Serializer):
@@ -221,6 +242,29 @@ class AddDeleteBasketSerializer(Serializer):
     )
 
 
+class BasketOperationSerializer(Serializer):
+    op = ChoiceField(
+        choices=("add", "remove", "set"),
+        help_text="add - добавить, remove - удалить, set - установить количество",
+    )
+    id = IntegerField(help_text="ID продукта")
+    count = IntegerField(
+        help_text="Количество, для add и remove - не меньше 1, set с 0 удаляет позицию",
+        min_value=0,
+    )
+
+    def validate(self, attrs):
+        if attrs["op"] != "set" and attrs["count"] < 1:
+            raise ValidationError(
+                {"count": "Ensure this value is greater than or equal to 1."}
+            )
+        return attrs
+
+
+class BasketBatchSerializer(Serializer):
+    operations = BasketOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
 class SalesSerializer(ModelSerializer):
     images = ImagesSerializer(many=True, source="image_set", read_only=True)
     dateFrom = SerializerMethodField()
@@ -1,125 +1,204 @@
-from django.db.models import Count, Avg, Min, Q
+import base64
+import binascii
+import copy
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import QueryDict
 from rest_framework import status
+from rest_framework.request import Request
 from rest_framework.response import Response
-from django.utils import timezone
 
 
-from .models import Product, Tag, Category, Review, Basket, BasketItem
+from .models import (
+    Product,
+    CategoryPriceStats,
+    Tag,
+    Review,
+    Basket,
+    BasketItem,
+    ProductRecommendation,
+)
 from onlinestore.dao import DAO
+from onlinestore.middleware import compression_stats
+from .search import ProductSearch
+from .category_tree import CategoryTree
+from .tag_index import TagIndex
+from .attribute_index import AttributeIndex
+from .columnar_index import ColumnarIndex
+from .active_sales import ActiveSales
+from .cache import cached_response, CatalogCache, CACHED_METHODS
+from .fast_serializers import (
+    CatalogListSerializer,
+    ProductsHomePageListSerializer,
+    SalesListSerializer,
+    BasketItemListSerializer,
+)
 from .serializers import (
-    CatalogSerializer,
     TagsSerializer,
-    CategoriesSerializer,
     BannerSerializer,
-    ProductsHomePageSerializer,
-    SalesSerializer,
     ProductSerializer,
+    BasketBatchSerializer,
     ReviewsSerializer,
-    BasketItemSerializer,
-    ImagesSerializer,
 )
 
+# сортировки каталога, для которых поддерживается курсорная пагинация
+CURSOR_SORTS = ("price", "rating", "reviews", "popularity", "date", "relevance")
+# поля модели для параметра sort, имя которых отличается от имени параметра
+SORT_FIELDS = {"reviews": "reviews_count", "price": "effective_price"}
+# максимальное количество продуктов в пакетном запросе /api/products/?ids=
+MAX_BATCH_IDS = 200
+
 
 class CatalogService:
     @classmethod
+    @cached_response(
+        "catalog",
+        ("product", "category", "tag", "image", "review", "specification"),
+        window=ActiveSales.window,
+        # популярность меняется с каждым заказом и влияет только на сортировку по ней
+        extra_models=lambda request: (
+            ("popularity",) if request.query_params.get("sort") == "popularity" else ()
+        ),
+    )
     def get_catalog(cls, request):
-        query = dict(request.query_params)
-        filter = {
-            "name": "",
-            "minPrice": "0",
-            "maxPrice": "500000",
-            "Delivery": "false",
-            "available": "false",
-            "currentPage": "1",
-            "sort": "price",
-            "sortType": "inc",
-            "tags[]": "",
-            "limit": "20",
-            "category": "",
-            "name_from_search": "",
-        }
-        # парсинг query, получение словаря параметров фильтрации и сортировки
-        for point in query:
-            if "filter[" in point:
-                name = point.rstrip("]").lstrip("filter[")
-            else:
-                name = point
-            filter.update({name: query[point][0]})
-
-        order_param = filter.get("sort")
-        _name = filter.get("name", "")
-        __name = filter.get("name_from_search", "")
-
-        name = _name or __name
-
-        tag_ids = []
-        tag_id = filter.get("tags[]", "")
-        if tag_id:
-            tag_ids.append(tag_id)
-
-        # вычисление списка родительских, или дочерних категорий для product
-        category_id = filter["category"]
-        cat_sub_ids = []
-        if category_id:
-            # При parent_id=None получаем родительские категории
-            # parent_id = Category.objects.filter(id=category_id).first().parent_id
-            parent_id = DAO.search_object_by_fields(
-                model=Category, filter={"id": category_id}, ext_method="first"
-            ).parent_id
-            print(parent_id)
-            cat_sub_ids = [
-                obj.pk
-                for obj in DAO.search_object_by_fields(
-                    model=Category,
-                    filter={
-                        **({"id": category_id} if parent_id else {}),
-                        **({"parent_id": category_id} if not parent_id else {}),
-                    },
-                    ext_method="all",
-                )
-            ]
-        # получаем продукты со связанными таблицами и агрегированными данными, производим сортировку и фильтрацию
-
+        try:
+            filter, product_filter = cls._catalog_filter(request)
+        except ValueError:
+            return Response(
+                {"error": "Specification range bounds must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        name = filter["name"]
+        order_param = filter["sort"]
+        cat_sub_ids = filter["category_ids"]
+        tag_ids = filter["tag_ids"]
+        tags_mode = filter["tagsMode"]
+
+        # получаем продукты со связанными таблицами, производим сортировку и фильтрацию
+        order_field = SORT_FIELDS.get(order_param, order_param)
+        # фильтр и сортировка по цене - по цене с учетом распродажи (Product.effective_price_sql)
+        price_annotation = {"effective_price": Product.effective_price_sql()}
         products = DAO.search_object_by_fields(
             model=Product,
             defer=("created_by", "archived", "fullDescription", "sortIndex"),
-            prefetch_related=("tags", "review_set", "image_set"),
+            prefetch_related=("tags", "image_set"),
             select_related=("category",),
-            annotate={"reviews": Count("review"), "rating": Avg("review__rate")},
-            filter={
-                "archived": False,
-                "price__gte": filter["minPrice"],
-                "price__lte": filter["maxPrice"],
-                **({"category__id__in": cat_sub_ids} if cat_sub_ids else {}),
-                **({"tags__id__in": tag_ids} if tag_ids else {}),
-                **({"count__gt": 0} if filter["available"] == "true" else {}),
-                **({"freeDelivery": True} if filter["Delivery"] == "true" else {}),
-                **({"title__iregex": name} if name else {}),
+            annotate={
+                **price_annotation,
+                **(
+                    {"relevance": ProductSearch.relevance(name)}
+                    if order_param == "relevance"
+                    else {}
+                ),
             },
+            filter=product_filter,
+            # pk при равных значениях ключа - порядок однозначен между страницами LIMIT/OFFSET,
+            # как у курсорной пагинации и колоночного индекса
             order_by=(
-                f"-{order_param}" if filter["sortType"] == "inc" else f"{order_param}"
+                (f"-{order_field}", "-pk")
+                if filter["sortType"] == "inc"
+                else (order_field, "pk")
             ),
-        ).all()
+        )
 
-        serializer = CatalogSerializer(products, many=True)
+        # курсорная пагинация (по запросу клиента), стоимость любой страницы как у первой
+        if "cursor" in request.query_params:
+            if order_param not in CURSOR_SORTS:
+                return Response(
+                    {
+                        "error": f"Cursor pagination is not supported for sort '{order_param}'"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return CatalogService._cursor_pagination(
+                products=products,
+                serializer_class=CatalogListSerializer,
+                cursor=request.query_params["cursor"],
+                sort=order_param,
+                sortType=filter["sortType"],
+                key=order_field,
+                limit=8,
+            )
 
-        # вычисление параметров пагинации
         currentPage = int(filter.get("currentPage", 1))
-        result = list(serializer.data)
-        numbers = len(result)
-        start, stop, lastPage = CatalogService._pagination(
-            numbers=numbers, currentPage=currentPage, limit=8
-        )
+
+        # фильтрация и сортировка по колоночному индексу в памяти, из БД выбираются только продукты страницы
+        columnar_page = None
+        if (
+            not name
+            and order_param in ColumnarIndex.SORTS
+            and ColumnarIndex.is_available()
+        ):
+            columnar_page = CatalogService._columnar_pagination(
+                filter=filter,
+                sort=order_param,
+                cat_sub_ids=cat_sub_ids,
+                tag_ids=tag_ids,
+                tags_mode=tags_mode,
+                attributes=filter["attributes"],
+                currentPage=currentPage,
+                limit=8,
+            )
+
+        if columnar_page:
+            page_ids, lastPage = columnar_page
+            positions = {pk: position for position, pk in enumerate(page_ids)}
+            items = sorted(
+                CatalogListSerializer(products.filter(id__in=page_ids)).data,
+                key=lambda item: positions[item["id"]],
+            )
+        else:
+            # для подсчёта количества не нужны аннотации и prefetch
+            count_products = DAO.search_object_by_fields(
+                model=Product, annotate=price_annotation, filter=product_filter
+            )
+
+            # вычисление параметров пагинации, сериализуются только продукты страницы
+            products, lastPage = CatalogService._pagination(
+                products=products,
+                currentPage=currentPage,
+                limit=8,
+                count_products=count_products,
+            )
+            items = CatalogListSerializer(products).data
 
         return Response(
             {
-                "items": result[start:stop],
+                "items": items,
                 "currentPage": currentPage,
                 "lastPage": lastPage,
             }
         )
 
     @classmethod
+    @cached_response(
+        "catalog_facets",
+        ("product", "category", "tag", "specification"),
+        window=ActiveSales.window,
+    )
+    def get_catalog_facets(cls, request):
+        """
+        Значения характеристик с количеством продуктов для текущих фильтров каталога
+        """
+        try:
+            filter, product_filter = cls._catalog_filter(request, attributes=False)
+        except ValueError:
+            return Response(
+                {"error": "Specification range bounds must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        products = DAO.search_object_by_fields(
+            model=Product,
+            annotate={"effective_price": Product.effective_price_sql()},
+            filter=product_filter,
+        ).values("pk")
+        return Response(AttributeIndex.facets(products, filter["attributes"]))
+
+    @classmethod
+    @cached_response("tags", ("tag", "category"))
     def get_tags(cls, request):
         query = dict(request.query_params)
         category_id = query.get("category", [None])[0]
@@ -135,37 +214,41 @@ class CatalogService:
         return Response(serializer.data)
 
     @classmethod
+    @cached_response("categories", ("category",))
     def get_categories(cls):
-        categories = DAO.search_object_by_fields(
-            model=Category, filter=dict(parent__isnull=True), ext_method="all"
-        )
-        serializer = CategoriesSerializer(categories, many=True)
-        return Response(serializer.data)
+        # формат CategoriesSerializer, данные из снимка дерева категорий без запросов на каждую категорию
+        return Response(CategoryTree.get().categories())
+
+    @classmethod
+    def get_category_breadcrumbs(cls, id):
+        tree = CategoryTree.get()
+        if id not in tree.nodes:
+            return Response(
+                {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(tree.breadcrumbs(id))
 
     @classmethod
+    @cached_response("banners", ("product", "category"))
     def get_banners(cls):
-        # Группируем по категориям и возвращаем мин. цену
-        min_prices = DAO.search_object_by_fields(
-            model=Product, values=("category_id",), annotate={"min_price": Min("price")}
-        )
-        products = DAO.search_object_by_fields(
-            model=Product,
-            filter=dict(
-                archived=False,
-                category__isnull=False,
-                price__in=[item["min_price"] for item in min_prices],
-            ),
+        # три категории с самой низкой минимальной ценой, по материализованной статистике цен
+        stats = DAO.search_object_by_fields(
+            model=CategoryPriceStats,
             select_related=("category",),
-            order_by="price",
-            ext_method="distinct",
+            order_by="min_price",
         )[:3]
-        serializer = BannerSerializer(products, many=True)
+        serializer = BannerSerializer(stats, many=True)
 
         return Response(serializer.data)
 
     @classmethod
-    def get_products_home_page(cls, stop=-1, sort_index=None, limit_edition=False):
-        """Возвращает объекты products, отфильтрованный по одному из заданных параметров sort_index, или limit_edition"""
+    @cached_response("products_home_page", ("product", "image", "popularity"))
+    def get_products_home_page(
+        cls, stop=-1, sort_index=None, limit_edition=False, popular=False
+    ):
+        """Возвращает объекты products, отфильтрованный по одному из заданных параметров sort_index, или limit_edition.
+        popular - сортировка по популярности по заказам, при равной популярности - по sortIndex
+        """
         products = DAO.search_object_by_fields(
             model=Product,
             defer=(
@@ -180,69 +263,212 @@ class CatalogService:
                 "category",
             ),
             prefetch_related=("image_set",),
-            annotate={"rating": Avg("review__rate")},
             filter={
                 **({"sortIndex__lte": sort_index} if sort_index else {}),
                 **({"limitedEdition": True} if limit_edition else {}),
             },
             ext_method="distinct",
-        )[:stop]
+        )
+        if popular:
+            products = products.order_by("-popularity", "sortIndex", "pk")
+        products = products[:stop]
 
-        serializer = ProductsHomePageSerializer(products, many=True)
+        serializer = ProductsHomePageListSerializer(products)
         result = serializer.data
 
         return Response(result)
 
     @classmethod
+    @cached_response("sales", ("product", "image"), window=ActiveSales.window)
     def get_sales(cls, request):
-        now = timezone.now()
+        # продукты на распродаже СЕЙЧАС, по предвычисленному списку (dateFrom <= сейчас <= dateTo)
         products = DAO.search_object_by_fields(
             model=Product,
-            filter=dict(  # Продукт на распродаже СЕЙЧАС
-                salePrice__isnull=False,
-                dateFrom__lte=now,  # Начало <= сейчас
-                dateTo__gte=now,  # Конец >= сейчас)
-                archived=False,
-            ),
+            filter={"id__in": ActiveSales.get().ids},
             select_related=("category",),
             prefetch_related=("image_set",),
             defer=("description", "count", "freeDelivery", "date", "tags"),
+            # pk уникален - порядок страниц LIMIT/OFFSET однозначен
+            order_by="pk",
         )
 
-        serializer = SalesSerializer(products, many=True)
+        if "cursor" in request.query_params:
+            return CatalogService._cursor_pagination(
+                products=products,
+                serializer_class=SalesListSerializer,
+                cursor=request.query_params["cursor"],
+                sort="pk",
+                sortType="dec",
+                limit=20,
+            )
 
-        # вычисление параметров пагинации
+        # вычисление параметров пагинации, сериализуются только продукты страницы
         currentPage = int(request.query_params.get("currentPage", 1))
-
-        result = list(serializer.data)
-        numbers = len(result)
-
-        start, stop, lastPage = CatalogService._pagination(
-            numbers=numbers, currentPage=currentPage, limit=20
+        products, lastPage = CatalogService._pagination(
+            products=products, currentPage=currentPage, limit=20
         )
+        serializer = SalesListSerializer(products)
 
         return Response(
             {
-                "items": result[start:stop],
+                "items": serializer.data,
                 "currentPage": currentPage,
                 "lastPage": lastPage,
             }
         )
 
     @classmethod
+    def get_home(cls, request):
+        """
+        Данные главной страницы одним запросом: секции совпадают с ответами отдельных эндпоинтов
+        и читаются из их кэша. Параметр sections - секции через запятую, по умолчанию все
+        """
+        sections = {
+            "categories": cls.get_categories,
+            "banners": cls.get_banners,
+            "popular": lambda: cls.get_products_home_page(stop=8, popular=True),
+            "limited": lambda: cls.get_products_home_page(stop=16, limit_edition=True),
+            # распродажа запрашивается без параметров, как первая страница /api/sales/
+            "sales": lambda: cls.get_sales(cls._section_request(request)),
+        }
+        names = [
+            name.strip()
+            for name in request.query_params.get("sections", "").split(",")
+            if name.strip()
+        ] or list(sections)
+        unknown = [name for name in names if name not in sections]
+        if unknown:
+            return Response(
+                {"error": f"Unknown sections: {', '.join(unknown)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({name: sections[name]().data for name in dict.fromkeys(names)})
+
+    @classmethod
+    @cached_response(
+        "product",
+        (
+            "product",
+            "category",
+            "tag",
+            "image",
+            "review",
+            "specification",
+            "productrecommendation",
+        ),
+        window=ActiveSales.window,
+    )
     def get_product(cls, id):
         product = DAO.search_object_by_fields(
-            model=Product,
-            defer=("created_by", "archived"),
-            prefetch_related=("tags", "review_set", "image_set", "specification_set"),
-            select_related=("category",),
-            annotate=(dict(rating=Avg("review__rate"))),
-            get_object_or_404_params={"pk": id},
+            **cls._product_details_params(), get_object_or_404_params={"pk": id}
         )
 
         serializer = ProductSerializer(product)
         return Response(serializer.data)
 
+    @classmethod
+    @cached_response(
+        "products_batch",
+        (
+            "product",
+            "category",
+            "tag",
+            "image",
+            "review",
+            "specification",
+            "productrecommendation",
+        ),
+        window=ActiveSales.window,
+    )
+    def get_products_batch(cls, request):
+        """
+        Продукты по списку id (?ids=1,2,3) в порядке запроса, одним запросом на каждую связь.
+        shape=full - формат ProductSerializer, shape=list - формат каталога.
+        Отсутствующие и архивные id не прерывают выборку и возвращаются в missing и archived
+        """
+        try:
+            ids = list(
+                dict.fromkeys(
+                    int(pk)
+                    for pk in request.query_params.get("ids", "").split(",")
+                    if pk.strip()
+                )
+            )
+        except ValueError:
+            return Response(
+                {"error": "ids must be a comma-separated list of integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ids or len(ids) > MAX_BATCH_IDS:
+            return Response(
+                {"error": f"ids must contain from 1 to {MAX_BATCH_IDS} product ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        shape = request.query_params.get("shape", "full")
+        if shape not in ("full", "list"):
+            return Response(
+                {"error": "shape must be 'full' or 'list'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        found = dict(
+            DAO.search_object_by_fields(
+                model=Product, filter={"id__in": ids}, order_by="pk"
+            ).values_list("id", "archived")
+        )
+        active = [pk for pk in ids if found.get(pk) is False]
+        if not active:
+            items = []
+        elif shape == "full":
+            products = DAO.search_object_by_fields(
+                **cls._product_details_params(), filter={"id__in": active}
+            )
+            items = ProductSerializer(products, many=True).data
+        else:
+            products = DAO.search_object_by_fields(
+                model=Product, filter={"id__in": active}
+            )
+            items = CatalogListSerializer(products).data
+        positions = {pk: position for position, pk in enumerate(active)}
+
+        return Response(
+            {
+                "items": sorted(items, key=lambda item: positions[item["id"]]),
+                "missing": [pk for pk in ids if pk not in found],
+                "archived": [pk for pk in ids if found.get(pk)],
+            }
+        )
+
+    @classmethod
+    @cached_response("product_reviews", ("review",))
+    def get_product_reviews(cls, request, id):
+        """
+        Отзывы продукта от новых к старым, курсорная пагинация по (date, id)
+        """
+        DAO.search_object_by_fields(
+            model=Product, values=("id",), get_object_or_404_params={"pk": id}
+        )
+        # без DAO: его select_related() без аргументов присоединяет продукт и автора продукта
+        reviews = Review.objects.filter(product_id=id)
+        try:
+            cursor = request.query_params.get("cursor", "")
+            last = cls._decode_cursor(cursor, "date", "dec") if cursor else None
+        except ValueError:
+            return Response(
+                {"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reviews, last = DAO.paginate_keyset(
+            reviews, key="date", descending=True, last=last, limit=20
+        )
+        return Response(
+            {
+                "items": ReviewsSerializer(reviews, many=True).data,
+                "nextCursor": cls._encode_cursor(last, "date", "dec") if last else None,
+            }
+        )
+
     @classmethod
     def post_product_review(cls, request, id):
         # ожидаем, что POST направлен на добавление отзыва к конкретному продукту
@@ -260,17 +486,18 @@ class CatalogService:
 
         serializer = ReviewsSerializer(data=request.data)
         if serializer.is_valid():
-            # создание отзыва и привязка к продукту
-            DAO.create_or_get(
-                Review,
-                dict(
-                    product=product,
-                    author=serializer.validated_data.get("author"),
-                    email=serializer.validated_data.get("email"),
-                    text=serializer.validated_data.get("text"),
-                    rate=serializer.validated_data.get("rate"),
-                ),
-            )
+            # создание отзыва, привязка к продукту и пересчет рейтинга (сигнал) в одной транзакции
+            with DAO.write_transaction(Review):
+                DAO.create_or_get(
+                    Review,
+                    dict(
+                        product=product,
+                        author=serializer.validated_data.get("author"),
+                        email=serializer.validated_data.get("email"),
+                        text=serializer.validated_data.get("text"),
+                        rate=serializer.validated_data.get("rate"),
+                    ),
+                )
             new_review = DAO.search_object_by_fields(
                 _object=product.review_set, order_by="-date", ext_method="first"
             )
@@ -280,42 +507,25 @@ class CatalogService:
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @classmethod
+    def get_cache_stats(cls):
+        return Response(
+            {
+                **CatalogCache.stats(CACHED_METHODS),
+                "compression": compression_stats(),
+            }
+        )
+
     @classmethod
     def get_basket(cls, request):
         if request.user.is_authenticated:
             basket = cls._user_basket(request)
-            if basket:
-                items = DAO.search_object_by_fields(
-                    _object=basket.items, select_related=("product",), ext_method="all"
-                )
-                serializer = BasketItemSerializer(items, many=True)
-                result = serializer.data
-            else:
-                result = {}
-            return Response(result)
+            return Response(cls._basket_items(basket) if basket else {})
 
         else:
-            basket = cls._anon_basket(request)
-            items_data = []
-            for product_id, count in basket.items():
-                try:
-                    product = DAO.search_object_by_fields(
-                        model=Product,
-                        prefetch_related=("image_set",),
-                        get={"id": product_id},
-                    )
-                    item_data = {
-                        "id": product.id,
-                        "title": product.title,
-                        "price": product.get_current_price(),
-                        "images": ImagesSerializer(product.image_set, many=True).data,
-                        "count": count,
-                    }
-                    items_data.append(item_data)
-                except Product.DoesNotExist:
-                    continue
-
-            return Response(items_data)
+            return Response(
+                BasketItemListSerializer(cls._anon_basket_rows(request)).data
+            )
 
     @classmethod
     def add_basket(cls, request):
@@ -329,17 +539,363 @@ class CatalogService:
         result = cls._change_basket(request, data, delete=True)
         return Response({"message": result["message"]}, result["status"])
 
+    @classmethod
+    def change_basket_batch(cls, request):
+        """
+        Пакет операций с корзиной (add, remove, set) в порядке запроса, ответ - итоговая корзина.
+        Корзина пользователя изменяется в одной транзакции: текущие количества читаются одним запросом,
+        итоговые записываются одним bulk upsert и одним DELETE; корзина анонима - одной записью в сессию.
+        Удаление продукта, которого нет в корзине, ничего не меняет, несуществующий продукт в add
+        или set отклоняет весь пакет
+        """
+        serializer = BasketBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = serializer.validated_data["operations"]
+
+        product_ids = {item["id"] for item in operations}
+        added_ids = {item["id"] for item in operations if item["op"] != "remove"}
+        existing = set(
+            DAO.search_object_by_fields(
+                model=Product, values=("id",), filter={"id__in": added_ids}
+            ).values_list("id", flat=True)
+        )
+        missing = sorted(added_ids - existing)
+        if missing:
+            return Response(
+                {"error": f"Products not found: {', '.join(map(str, missing))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not request.user.is_authenticated:
+            basket = cls._anon_basket(request)
+            counts = cls._apply_basket_operations(basket, operations, key=str)
+            request.session["basket"] = {
+                pk: count for pk, count in counts.items() if count
+            }
+            return Response(
+                BasketItemListSerializer(cls._anon_basket_rows(request)).data
+            )
+
+        basket = cls._user_basket(request)
+        # чтение текущих количеств и запись итоговых под блокировкой записи
+        with DAO.write_transaction(BasketItem):
+            current = dict(
+                BasketItem.objects.select_for_update()
+                .filter(basket=basket, product_id__in=product_ids)
+                .values_list("product_id", "count")
+            )
+            counts = cls._apply_basket_operations(current, operations, key=int)
+            changed = {
+                pk: count for pk, count in counts.items() if current.get(pk) != count
+            }
+            BasketItem.objects.bulk_create(
+                [
+                    BasketItem(basket=basket, product_id=pk, count=count)
+                    for pk, count in changed.items()
+                    if count
+                ],
+                update_conflicts=True,
+                unique_fields=("basket", "product"),
+                update_fields=("count",),
+            )
+            removed = [pk for pk, count in changed.items() if not count]
+            if removed:
+                BasketItem.objects.filter(
+                    basket=basket, product_id__in=removed
+                ).delete()
+        return Response(cls._basket_items(basket))
+
+    @staticmethod
+    def _apply_basket_operations(counts, operations, key) -> dict:
+        """
+        Количества продуктов после операций по порядку, 0 - позиция удаляется.
+        key - тип ключа продукта в counts (int для БД, str для сессии)
+        """
+        counts = dict(counts)
+        for operation in operations:
+            pk = key(operation["id"])
+            current = counts.get(pk, 0)
+            if operation["op"] == "add":
+                counts[pk] = current + operation["count"]
+            elif operation["op"] == "remove":
+                counts[pk] = max(current - operation["count"], 0)
+            else:
+                counts[pk] = operation["count"]
+        return counts
+
+    @staticmethod
+    def _basket_items(basket) -> list:
+        items = DAO.search_object_by_fields(
+            _object=basket.items, select_related=("product",), ext_method="all"
+        )
+        return BasketItemListSerializer(items).data
+
+    @staticmethod
+    def _product_details_params() -> dict:
+        """
+        Параметры DAO для продуктов в формате ProductSerializer: связи - одним запросом на каждую,
+        в ответ встраиваются только последние отзывы (остальные - через get_product_reviews)
+        и не архивные рекомендации из ProductRecommendation
+        """
+        return dict(
+            model=Product,
+            defer=("created_by", "archived"),
+            prefetch_related=(
+                "tags",
+                "image_set",
+                "specification_set",
+                Prefetch(
+                    "review_set",
+                    queryset=Review.objects.order_by("-date", "-id")[
+                        : settings.PRODUCT_REVIEWS_LIMIT
+                    ],
+                    to_attr="latest_reviews",
+                ),
+                Prefetch(
+                    "recommendations",
+                    queryset=ProductRecommendation.objects.filter(
+                        recommended__archived=False
+                    ).order_by("-count", "recommended_id"),
+                    to_attr="also_bought",
+                ),
+            ),
+            select_related=("category",),
+            annotate={"effective_price": Product.effective_price_sql()},
+        )
+
     @staticmethod
-    def _pagination(numbers, currentPage, limit):
+    def _section_request(request) -> Request:
+        # копия запроса без query-параметров: ключ кэша совпадает с ключом отдельного эндпоинта
+        http_request = copy.copy(request._request)
+        http_request.GET = QueryDict()
+        return Request(http_request)
+
+    @classmethod
+    def _catalog_filter(cls, request, attributes=True) -> tuple:
+        """
+        Параметры каталога из запроса и условие фильтрации продуктов для DAO.search_object_by_fields.
+        attributes=False - без фильтра по характеристикам (фасеты).
+        ValueError - если граница диапазона характеристики не число
+        """
+        query = dict(request.query_params)
+        filter = {
+            "name": "",
+            "minPrice": "0",
+            "maxPrice": "500000",
+            "Delivery": "false",
+            "available": "false",
+            "currentPage": "1",
+            "sort": "price",
+            "sortType": "inc",
+            "tags[]": "",
+            "limit": "20",
+            "category": "",
+            "name_from_search": "",
+        }
+        # парсинг query, получение словаря параметров фильтрации и сортировки
+        for point in query:
+            if "filter[" in point:
+                name = point.rstrip("]").lstrip("filter[")
+            else:
+                name = point
+            filter.update({name: query[point][0]})
+
+        name = filter["name"] = filter.get("name", "") or filter.get(
+            "name_from_search", ""
+        )
+
+        # поиск без явной сортировки ранжируется по релевантности (BM25), лучшие совпадения первыми;
+        # без поискового запроса релевантности нет, sort=relevance заменяется сортировкой по умолчанию
+        searchable = ProductSearch.match_query(name) and ProductSearch.is_available()
+        if searchable and "sort" not in query:
+            filter["sort"] = "relevance"
+            filter["sortType"] = "dec"
+        elif not searchable and filter["sort"] == "relevance":
+            filter["sort"] = "price"
+
+        # несколько тегов: tagsMode=or - хотя бы один из тегов, tagsMode=and - все теги
+        filter["tag_ids"] = [
+            int(tag_id)
+            for tag_id in request.query_params.getlist("tags[]")
+            if tag_id.isdigit()
+        ]
+        filter["tagsMode"] = "and" if filter.get("tagsMode") == "and" else "or"
+
+        # вычисление списка категорий для product по снимку дерева категорий:
+        # для корневой категории - все её потомки, для дочерней - она сама
+        category_id = filter["category"]
+        cat_sub_ids = []
+        if category_id:
+            tree = CategoryTree.get()
+            node = tree.nodes.get(int(category_id)) if category_id.isdigit() else None
+            if node and node["parent_id"] is None:
+                cat_sub_ids = sorted(tree.descendants[node["id"]])
+            else:
+                cat_sub_ids = [category_id]
+        filter["category_ids"] = cat_sub_ids
+
+        # характеристики: spec[RAM]=16 ГБ, spec[Экран][min]=13&spec[Экран][max]=15
+        filter["attributes"] = AttributeIndex.parse(request.query_params)
+
+        product_filter = {
+            "archived": False,
+            "effective_price__gte": filter["minPrice"],
+            "effective_price__lte": filter["maxPrice"],
+            **({"category__id__in": cat_sub_ids} if cat_sub_ids else {}),
+            **({"count__gt": 0} if filter["available"] == "true" else {}),
+            **({"freeDelivery": True} if filter["Delivery"] == "true" else {}),
+            **cls._ids_filter(
+                TagIndex.filter(filter["tag_ids"], filter["tagsMode"]),
+                ProductSearch.filter(name),
+                AttributeIndex.filter(filter["attributes"]) if attributes else {},
+            ),
+        }
+        return filter, product_filter
+
+    @staticmethod
+    def _ids_filter(*filters) -> dict:
+        """
+        Объединение по AND условий фильтрации по id продуктов (теги, поиск, характеристики):
+        условия могут использовать один и тот же ключ id__in, поэтому несколько условий
+        передаются в БД одним подзапросом, а не слиянием словарей
+        """
+        filters = [ids_filter for ids_filter in filters if ids_filter]
+        if len(filters) <= 1:
+            return filters[0] if filters else {}
+        products = Product.objects.all()
+        for ids_filter in filters:
+            products = products.filter(**ids_filter)
+        return {"pk__in": products.values("pk")}
+
+    @staticmethod
+    def _pagination(products, currentPage, limit, count_products=None):
+        """
+        Выборка страницы продуктов средствами БД (LIMIT/OFFSET) и вычисление номера последней страницы
+        """
+        products, numbers = DAO.paginate(
+            products, page=currentPage, limit=limit, count_obj=count_products
+        )
         lastPage = numbers // limit
 
         if numbers % limit:
             lastPage += 1
 
-        start = (currentPage - 1) * limit
-        stop = start + limit
+        return products, lastPage
 
-        return start, stop, lastPage
+    @staticmethod
+    def _columnar_pagination(
+        filter, sort, cat_sub_ids, tag_ids, tags_mode, attributes, currentPage, limit
+    ):
+        """
+        id продуктов страницы каталога и номер последней страницы по колоночному индексу.
+        None - если фильтр не может быть разрешен индексом или индекс перестраивается
+        """
+        try:
+            min_price = ColumnarIndex.parse_price(filter["minPrice"])
+            max_price = ColumnarIndex.parse_price(filter["maxPrice"])
+            category_ids = [int(pk) for pk in cat_sub_ids]
+        except ValueError:
+            return None
+
+        index = ColumnarIndex.get()
+        if index is None:
+            return None
+
+        product_ids = None
+        if tag_ids:
+            tag_index = TagIndex.get()
+            product_ids = tag_index.ids(tag_index.match(tag_ids, tags_mode))
+        if attributes:
+            attribute_ids = AttributeIndex.product_ids(attributes)
+            product_ids = (
+                attribute_ids
+                if product_ids is None
+                else sorted(set(product_ids) & set(attribute_ids))
+            )
+
+        mask = index.mask(
+            min_price=min_price,
+            max_price=max_price,
+            category_ids=category_ids,
+            product_ids=product_ids,
+            available=filter["available"] == "true",
+            free_delivery=filter["Delivery"] == "true",
+        )
+        page_ids, numbers = index.page(
+            mask,
+            sort=sort,
+            descending=filter["sortType"] == "inc",
+            page=currentPage,
+            limit=limit,
+        )
+        lastPage = numbers // limit
+
+        if numbers % limit:
+            lastPage += 1
+
+        return page_ids, lastPage
+
+    @classmethod
+    def _cursor_pagination(
+        cls, products, serializer_class, cursor, sort, sortType, limit, key=None
+    ):
+        """
+        Страница продуктов после курсора (ключ сортировки, pk) и курсор следующей страницы.
+        Пустой курсор - первая страница, nextCursor=None - страниц больше нет.
+        key - поле модели для сортировки, по умолчанию совпадает с sort
+        """
+        try:
+            last = cls._decode_cursor(cursor, sort, sortType) if cursor else None
+        except ValueError:
+            return Response(
+                {"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products, last = DAO.paginate_keyset(
+            serializer_class.rows(products, key or sort),
+            key=key or sort,
+            descending=sortType == "inc",
+            last=last,
+            limit=limit,
+        )
+        serializer = serializer_class(products)
+
+        return Response(
+            {
+                "items": serializer.data,
+                "nextCursor": (
+                    cls._encode_cursor(last, sort, sortType) if last else None
+                ),
+            }
+        )
+
+    @staticmethod
+    def _encode_cursor(last, sort, sortType) -> str:
+        """
+        Непрозрачный токен курсора: значение ключа сортировки и pk последнего продукта страницы
+        """
+        value, pk = last
+        data = {"sort": sort, "sortType": sortType, "value": value, "id": pk}
+        token = json.dumps(data, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor, sort, sortType) -> tuple:
+        """
+        Разбор токена курсора, ValueError - если токен поврежден, или выдан для другой сортировки
+        """
+        try:
+            token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data = json.loads(token)
+            value, pk = data["value"], int(data["id"])
+        except (binascii.Error, UnicodeDecodeError, TypeError, KeyError) as ex:
+            raise ValueError("Invalid cursor") from ex
+
+        if data.get("sort") != sort or data.get("sortType") != sortType:
+            raise ValueError("Cursor does not match sort")
+
+        return value, pk
 
     @classmethod
     def _user_basket(cls, request):
@@ -350,18 +906,13 @@ class CatalogService:
             model=Basket,
             data_dict=dict(user=request.user, defaults={"user": request.user}),
         )  # Только для user
-        # Находим анонимную корзину
+        # Переносим товары анонимной корзины в корзину пользователя, удаленные продукты пропускаются
         basket_anon = cls._anon_basket(request)
         if basket_anon:
-            # Переносим товары в корзину пользователя
-            basket_user, _ = DAO.create_or_get(
-                model=Basket, data_dict={"user": request.user}
-            )
-            items = [
-                BasketItem(basket=basket_user, product_id=product_id, count=count)
-                for product_id, count in basket_anon.items()
-            ]
-            BasketItem.objects.bulk_create(items)
+            with transaction.atomic():
+                for product_id, count in basket_anon.items():
+                    if product_id.isdigit():
+                        cls._add_basket_item(basket, int(product_id), count)
             if "basket" in request.session:
                 del request.session["basket"]
 
@@ -372,16 +923,49 @@ class CatalogService:
         """
         Получение из сессии корзины анонима
         """
-        session = request.session
-        if not session.session_key:
-            session.update({"basket": {}})
-        basket = session.get("basket", {})
-        return basket
+        return request.session.get("basket", {})
+
+    @classmethod
+    def _anon_basket_rows(cls, request) -> list:
+        """
+        Строки корзины анонима в формате BasketItemListSerializer: продукты - одним запросом,
+        позиции удаленных продуктов удаляются из сессии
+        """
+        basket = cls._anon_basket(request)
+        products = {
+            row["id"]: row
+            for row in DAO.search_object_by_fields(
+                model=Product,
+                annotate={"effective_price": Product.effective_price_sql()},
+                filter={"id__in": [int(pk) for pk in basket if pk.isdigit()]},
+            ).values("id", "title", "effective_price")
+        }
+        stale = [pk for pk in basket if not pk.isdigit() or int(pk) not in products]
+        if stale:
+            for pk in stale:
+                basket.pop(pk)
+            request.session["basket"] = basket
+
+        rows = []
+        for pk, count in basket.items():
+            product = products[int(pk)]
+            rows.append(
+                {
+                    "product_id": product["id"],
+                    "product__title": product["title"],
+                    "effective_price": product["effective_price"],
+                    "count": count,
+                }
+            )
+        return rows
 
     @classmethod
     def _change_basket(cls, request, data, delete=False):
         """
-        Создание/изменение корзины
+        Создание/изменение корзины. Корзина пользователя изменяется без чтения позиции:
+        добавление - одним upsert с увеличением количества в БД и проверкой существования продукта
+        в том же запросе, удаление - условным UPDATE с уменьшением количества или условным DELETE,
+        если количество не больше удаляемого
         """
         id = str(data["id"])
         count = data.get("count", 1)
@@ -389,27 +973,13 @@ class CatalogService:
             # для корзины авторизованного пользователя (из бд)
             basket = cls._user_basket(request)
             if delete:
-                item = BasketItem.objects.filter(
-                    basket=basket, product_id=data["id"]
-                ).first()
-                if not item:
-                    return {"status": 400, "message": "Item not in basket"}
-
-                if item.count > count:
-                    item.count -= count
-                    item.save()
-                else:
-                    item.delete()
-            else:
-                product = Product.objects.filter(id=id).first()
-                if not product:
-                    return {"message": "Product not found", "status": 400}
-                item, created = BasketItem.objects.get_or_create(
-                    basket=basket, product=product, defaults={"count": count}
-                )
-                if not created:
-                    item.count += data.get("count", 1)
-                    item.save()
+                items = BasketItem.objects.filter(basket=basket, product_id=data["id"])
+                if not items.filter(count__gt=count).update(count=F("count") - count):
+                    deleted, _ = items.filter(count__lte=count).delete()
+                    if not deleted:
+                        return {"status": 400, "message": "Item not in basket"}
+            elif not cls._add_basket_item(basket, data["id"], count):
+                return {"message": "Product not found", "status": 400}
         else:
             # для корзины анонимного пользователя (из сессии)
             session = request.session
@@ -430,3 +1000,18 @@ class CatalogService:
             session["basket"] = basket
 
         return {"message": "successful", "status": 200}
+
+    @staticmethod
+    def _add_basket_item(basket, product_id, count) -> bool:
+        """
+        Добавление продукта в корзину одним запросом, False - продукт не существует
+        """
+        return bool(
+            DAO.upsert_increment(
+                model=BasketItem,
+                lookup={"basket": basket.pk, "product": product_id},
+                field="count",
+                amount=count,
+                exists=(Product, product_id),
+            )
+        )
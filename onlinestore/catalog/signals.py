@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_init,
+    pre_save,
+    post_save,
+    post_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from .cache import CatalogCache
+from .columnar_index import ProductFeed
+from .models import (
+    Product,
+    Category,
+    CategoryPriceStats,
+    ProductAttribute,
+    Tag,
+    Image,
+    Review,
+    Specification,
+)
+from .search import ProductSearch
+from .tag_index import TagIndex
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """
+    Обновление полнотекстового индекса и журнала изменений колоночного индекса при сохранении продукта
+    """
+    ProductSearch.index_products([instance.pk])
+    ProductFeed.publish([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    ProductSearch.remove_products([instance.pk])
+    ProductFeed.publish([instance.pk])
+
+
+@receiver(post_init, sender=Product)
+def product_loaded(sender, instance, **kwargs):
+    # категория на момент загрузки; если поле отложено, она читается из БД перед сохранением
+    if "category_id" in instance.__dict__:
+        instance._loaded_category_id = instance.category_id
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw, **kwargs):
+    if not hasattr(instance, "_loaded_category_id"):
+        instance._loaded_category_id = (
+            Product.objects.filter(pk=instance.pk)
+            .values_list("category_id", flat=True)
+            .first()
+            if instance.pk and not raw
+            else None
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_price_stats_changed(sender, instance, **kwargs):
+    """
+    Пересчет статистики цен прежней и новой категории продукта
+    """
+    CategoryPriceStats.refresh(
+        [getattr(instance, "_loaded_category_id", None), instance.category_id]
+    )
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    # продукт на момент загрузки, чтобы при переносе отзыва пересчитать и прежний продукт
+    if "product_id" in instance.__dict__:
+        instance._loaded_product_id = instance.product_id
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    """
+    Пересчет рейтинга, количества отзывов и гистограммы оценок прежнего и нового продукта отзыва
+    """
+    ids = {getattr(instance, "_loaded_product_id", None), instance.product_id}
+    Product.update_reviews_stats(pk for pk in ids if pk is not None)
+    instance._loaded_product_id = instance.product_id
+
+
+@receiver(post_save, sender=Specification)
+def specification_saved(sender, instance, **kwargs):
+    """
+    Обновление индекса характеристик, при удалении строка индекса удаляется каскадом
+    """
+    ProductAttribute.from_specification(instance).save()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def catalog_changed(sender, **kwargs):
+    """
+    Инвалидация кэша ответов каталога, зависящих от измененной модели
+    """
+    CatalogCache.bump(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    CatalogCache.bump("product", "tag")
+
+    # инкрементальное обновление индекса тегов после фиксации транзакции
+    if action == "post_clear":
+        changes = {"drop_tags" if reverse else "drop_products": [instance.pk]}
+    else:
+        pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set]
+        changes = {"add" if action == "post_add" else "remove": pairs}
+    transaction.on_commit(lambda: TagIndex.update(**changes))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # после удаления instance.pk становится None, id сохраняется до фиксации транзакции
+    ids = [instance.pk]
+    transaction.on_commit(lambda: TagIndex.update(drop_tags=ids))
+
+
+@receiver(post_delete, sender=Product)
+def product_tags_deleted(sender, instance, **kwargs):
+    ids = [instance.pk]
+    transaction.on_commit(lambda: TagIndex.update(drop_products=ids))
@@ -6,6 +6,7 @@ from .serializers import (
     CatalogSerializer,
     TagsSerializer,
     CategoriesSerializer,
+    CategoryBreadcrumbSerializer,
     BannerSerializer,
     ProductsHomePageSerializer,
     SalesSerializer,
@@ -13,11 +14,24 @@ from .serializers import (
     ReviewsSerializer,
     BasketItemSerializer,
     AddDeleteBasketSerializer,
+    BasketBatchSerializer,
     SuccessSerializer,
     ErrorSerializer,
 )
 
 
+cursor_parameter = OpenApiParameter(
+    name="cursor",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description=(
+        "Курсорная пагинация: пустое значение - первая страница, далее nextCursor из ответа. "
+        "Без параметра - пагинация по currentPage/lastPage"
+    ),
+    required=False,
+)
+
+
 catalog_schema = dict(
     description="get catalog items",
     tags=["catalog"],
@@ -42,7 +56,7 @@ catalog_schema = dict(
             name="filter[name]",
             type=OpenApiTypes.STR,
             location=OpenApiParameter.QUERY,
-            description="Поиск по названию (iregex)",
+            description="Полнотекстовый поиск по названию и описанию, без sort - по релевантности",
             default="",
         ),
         OpenApiParameter(
@@ -63,7 +77,7 @@ catalog_schema = dict(
             name="sort",
             type=OpenApiTypes.STR,
             location=OpenApiParameter.QUERY,
-            enum=["rating", "price", "reviews", "date"],
+            enum=["rating", "price", "reviews", "popularity", "date", "relevance"],
             description="Вид сортировки",
             default="price",
         ),
@@ -84,11 +98,38 @@ catalog_schema = dict(
         ),
         OpenApiParameter(
             name="tags[]",
-            type=OpenApiTypes.INT,
+            type={"type": "array", "items": {"type": "integer"}},
             location=OpenApiParameter.QUERY,
-            description="Поиск по тегу",
+            description="Поиск по тегам, параметр можно передать несколько раз",
             default="",
         ),
+        OpenApiParameter(
+            name="tagsMode",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            enum=["or", "and"],
+            description="Несколько тегов: or - хотя бы один из тегов, and - все теги",
+            default="or",
+        ),
+        OpenApiParameter(
+            name="spec[{name}]",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Фильтр по характеристике: spec[Тип памяти]=DDR5, несколько значений - любое из них; "
+            "диапазон числа в начале значения: spec[Объем модуля][min]=16&spec[Объем модуля][max]=32",
+        ),
+        cursor_parameter,
+    ],
+)
+
+catalog_facets_schema = dict(
+    description="get specification values with product counts for the current catalog filters",
+    tags=["catalog"],
+    responses={200: OpenApiTypes.OBJECT, 400: ErrorSerializer},
+    parameters=[
+        parameter
+        for parameter in catalog_schema["parameters"]
+        if parameter.name not in ("sort", "sortType", "limit", "cursor")
     ],
 )
 
@@ -105,6 +146,12 @@ categories_schema = dict(
     responses={200: CategoriesSerializer, 400: ErrorSerializer},
 )
 
+category_breadcrumbs_schema = dict(
+    description="get path from root category to category",
+    tags=["catalog"],
+    responses={200: CategoryBreadcrumbSerializer(many=True), 404: ErrorSerializer},
+)
+
 banners_schema = dict(
     description="get banner items",
     tags=["catalog"],
@@ -127,6 +174,22 @@ sales_schema = dict(
     tags=["catalog"],
     request=SalesSerializer,
     responses={200: SalesSerializer, 400: {"error": "Bad Request"}},
+    parameters=[cursor_parameter],
+)
+
+home_schema = dict(
+    description="get home page sections (categories, banners, popular, limited, sales) in one request",
+    tags=["catalog"],
+    responses={200: OpenApiTypes.OBJECT, 400: ErrorSerializer},
+    parameters=[
+        OpenApiParameter(
+            name="sections",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Секции через запятую, например banners,sales. По умолчанию все",
+            required=False,
+        )
+    ],
 )
 
 product_schema = dict(
@@ -136,6 +199,29 @@ product_schema = dict(
     responses={200: ProductSerializer, 400: {"error": "Bad Request"}},
 )
 
+products_batch_schema = dict(
+    description="get products by ids in one request (carts, comparisons, recently viewed)",
+    tags=["product"],
+    responses={200: OpenApiTypes.OBJECT, 400: ErrorSerializer},
+    parameters=[
+        OpenApiParameter(
+            name="ids",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="id продуктов через запятую, не больше 200",
+            required=True,
+        ),
+        OpenApiParameter(
+            name="shape",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            enum=["full", "list"],
+            description="full - формат продукта, list - формат каталога",
+            default="full",
+        ),
+    ],
+)
+
 product_review_schema = dict(
     description="post product review",
     tags=["product"],
@@ -143,6 +229,13 @@ product_review_schema = dict(
     responses={200: ReviewsSerializer, 400: {"error": "Bad Request"}},
 )
 
+product_reviews_schema = dict(
+    description="get product reviews, newest first, cursor pagination",
+    tags=["product"],
+    responses={200: ReviewsSerializer(many=True), 400: ErrorSerializer},
+    parameters=[cursor_parameter],
+)
+
 get_basket_schema = dict(
     description="Get items in basket",
     tags=["basket"],
@@ -159,3 +252,16 @@ add_basket_schema = dict(
 
 delete_basket_schema = add_basket_schema.copy()
 delete_basket_schema["description"] = "Remove item from basket"
+
+basket_batch_schema = dict(
+    description="Apply add, remove and set operations to basket in one request, returns the resulting basket",
+    tags=["basket"],
+    request=BasketBatchSerializer,
+    responses={200: BasketItemSerializer(many=True), 400: ErrorSerializer},
+)
+
+cache_stats_schema = dict(
+    description="Catalog response cache hits/misses by method and response compression stats (admin only)",
+    tags=["service"],
+    responses={200: OpenApiTypes.OBJECT, 403: ErrorSerializer},
+)
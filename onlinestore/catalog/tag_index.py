@@ -0,0 +1,116 @@
+import threading
+
+from django.db.models import Count, Subquery
+
+from .cache import CatalogCache
+from .models import Product
+
+ProductTag = Product.tags.through
+
+# при большем количестве найденных продуктов фильтр передается в БД подзапросом, а не списком id
+MAX_IDS_IN_QUERY = 1000
+
+
+class TagIndex:
+    """
+    Индекс тег -> продукты в памяти процесса. Множество продуктов тега хранится битовой картой
+    (int, бит N - продукт с id N), пересечения и объединения тегов выполняются побитово.
+    Строится одним запросом по Product.tags.through и обновляется инкрементально сигналами m2m_changed,
+    изменения из других процессов отслеживаются по счетчику поколения "product_tags" в кэше каталога
+    """
+
+    _snapshot = None
+    _lock = threading.Lock()
+
+    def __init__(self, rows, generation=None):
+        self.generation = generation
+        self.bitmaps = {}
+        for tag_id, product_id in rows:
+            self.bitmaps[tag_id] = self.bitmaps.get(tag_id, 0) | (1 << product_id)
+
+    @classmethod
+    def get(cls) -> "TagIndex":
+        (generation,) = CatalogCache.generations(("product_tags",))
+        snapshot = cls._snapshot
+        if snapshot is None or snapshot.generation != generation:
+            with cls._lock:
+                snapshot = cls._snapshot
+                if snapshot is None or snapshot.generation != generation:
+                    rows = ProductTag.objects.values_list("tag_id", "product_id")
+                    snapshot = cls(rows.iterator(), generation)
+                    cls._snapshot = snapshot
+        return snapshot
+
+    @classmethod
+    def update(cls, add=(), remove=(), drop_tags=(), drop_products=()):
+        """
+        Инкрементальное обновление индекса процесса парами (tag_id, product_id).
+        Если индекс успел измениться в другом процессе, он будет перестроен при следующем обращении
+        """
+        with cls._lock:
+            snapshot = cls._snapshot
+            (generation,) = CatalogCache.bump("product_tags")
+            if snapshot is None:
+                return
+            for tag_id, product_id in add:
+                snapshot.bitmaps[tag_id] = snapshot.bitmaps.get(tag_id, 0) | (
+                    1 << product_id
+                )
+            for tag_id, product_id in remove:
+                if tag_id in snapshot.bitmaps:
+                    snapshot.bitmaps[tag_id] &= ~(1 << product_id)
+            for tag_id in drop_tags:
+                snapshot.bitmaps.pop(tag_id, None)
+            for product_id in drop_products:
+                mask = ~(1 << product_id)
+                for tag_id in snapshot.bitmaps:
+                    snapshot.bitmaps[tag_id] &= mask
+            if (
+                snapshot.generation is not None
+                and generation == snapshot.generation + 1
+            ):
+                snapshot.generation = generation
+
+    def match(self, tag_ids, mode="or") -> int:
+        """
+        Битовая карта продуктов, у которых есть все (mode="and") или хотя бы один (mode="or") из тегов
+        """
+        bitmaps = [self.bitmaps.get(tag_id, 0) for tag_id in tag_ids]
+        if not bitmaps:
+            return 0
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if mode == "and" else result | bitmap
+        return result
+
+    @staticmethod
+    def ids(bitmap) -> list:
+        """
+        Список id продуктов битовой карты по возрастанию
+        """
+        bits = bin(bitmap)[:1:-1]
+        result = []
+        position = bits.find("1")
+        while position != -1:
+            result.append(position)
+            position = bits.find("1", position + 1)
+        return result
+
+    @classmethod
+    def filter(cls, tag_ids, mode="or") -> dict:
+        """
+        Условие фильтрации продуктов по тегам для DAO.search_object_by_fields.
+        Небольшой результат передается списком id, большой - подзапросом по таблице связей без дублей строк
+        """
+        if not tag_ids:
+            return {}
+        bitmap = cls.get().match(tag_ids, mode)
+        if bitmap.bit_count() <= MAX_IDS_IN_QUERY:
+            return {"id__in": cls.ids(bitmap)}
+
+        links = ProductTag.objects.filter(tag_id__in=tag_ids).values("product_id")
+        if mode == "and":
+            links = links.annotate(tags_count=Count("tag_id")).filter(
+                tags_count=len(set(tag_ids))
+            )
+        return {"id__in": Subquery(links.values("product_id"))}
@@ -1,3 +1,624 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import JSONRenderer
+
+from onlinestore.renderers import FastJSONRenderer
+from .cache import CatalogCache
+from .columnar_index import ColumnarIndex, ProductFeed, np
+from .fast_serializers import (
+    CatalogListSerializer,
+    ProductsHomePageListSerializer,
+    SalesListSerializer,
+    BasketItemListSerializer,
+)
+from .models import Product, Category, Basket, BasketItem, Review
+from .serializers import (
+    CatalogSerializer,
+    ProductsHomePageSerializer,
+    SalesSerializer,
+    BasketItemSerializer,
+)
+
+FIXTURE = str(settings.BASE_DIR / "onlinestore-fixture.json")
+
+
+class FastSerializersTestCase(TestCase):
+    """
+    Сериализаторы списков на values() выдают тот же JSON, что и DRF-сериализаторы
+    """
+
+    fixtures = [FIXTURE]
+
+    def assertSameJSON(self, serializer_class, fast_serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        result = JSONRenderer().render(fast_serializer_class(queryset).data)
+        self.assertEqual(result, expected)
+
+    def test_catalog(self):
+        # продукт на распродаже: в каталоге цена с учетом распродажи
+        now = timezone.now()
+        Product.objects.filter(pk=1).update(
+            salePrice=Decimal("1.00"),
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        products = (
+            Product.objects.prefetch_related("tags", "image_set")
+            .annotate(effective_price=Product.effective_price_sql())
+            .order_by("pk")
+        )
+        self.assertTrue(products.filter(tags__isnull=False).exists())
+        self.assertSameJSON(CatalogSerializer, CatalogListSerializer, products)
+        self.assertEqual(CatalogListSerializer(products).data[0]["price"], "1.00")
+        # без аннотации в запросе она добавляется сериализатором
+        self.assertEqual(
+            CatalogListSerializer(Product.objects.order_by("pk")).data,
+            CatalogListSerializer(products).data,
+        )
+
+    def test_products_home_page(self):
+        products = Product.objects.prefetch_related("image_set").order_by("-price")
+        self.assertSameJSON(
+            ProductsHomePageSerializer, ProductsHomePageListSerializer, products
+        )
+
+    def test_sales(self):
+        products = Product.objects.prefetch_related("image_set").order_by("pk")
+        self.assertSameJSON(SalesSerializer, SalesListSerializer, products)
+
+    def test_basket_items(self):
+        items = (
+            BasketItem.objects.select_related("product")
+            .annotate(effective_price=Product.effective_price_sql("product__"))
+            .order_by("pk")
+        )
+        self.assertTrue(items.exists())
+        self.assertSameJSON(BasketItemSerializer, BasketItemListSerializer, items)
+
+    def test_empty(self):
+        self.assertEqual(CatalogListSerializer(Product.objects.none()).data, [])
+
+
+class FastJSONRendererTestCase(TestCase):
+    """
+    FastJSONRenderer выдает тот же JSON, что и JSONRenderer DRF
+    """
+
+    fixtures = [FIXTURE]
+
+    def assertSameRender(self, data, **kwargs):
+        expected = JSONRenderer().render(data, **kwargs)
+        self.assertEqual(FastJSONRenderer().render(data, **kwargs), expected)
+        with mock.patch("onlinestore.renderers.orjson", None):
+            self.assertEqual(FastJSONRenderer().render(data, **kwargs), expected)
+
+    def test_values(self):
+        self.assertSameRender(
+            {
+                "decimal": Decimal("1234.50"),
+                "datetime": datetime(
+                    2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc
+                ),
+                "naive": datetime(2025, 1, 2, 3, 4, 5),
+                "date": date(2025, 1, 2),
+                "time": time(3, 4, 5, 678901),
+                "lazy": gettext_lazy("Category"),
+                "text": 'Текст \u2028 \u2029 "\\ \x00\x1f\x7f /',
+                "numbers": [0, -1, 2**63 - 1, 0.1, 1.5, 4.25, None, True, False],
+                "nested": {1: [(1, 2), {"a": {}}], "b": []},
+                "big": 2**70,
+            }
+        )
+
+    def test_phone_number(self):
+        number = PhoneNumber.from_string("+79991234567")
+        result = FastJSONRenderer().render({"phone": number})
+        self.assertEqual(result, JSONRenderer().render({"phone": str(number)}))
+
+    def test_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_indent(self):
+        self.assertSameRender(
+            {"items": [1, {"a": Decimal("1.00")}]},
+            accepted_media_type="application/json; indent=4",
+        )
+
+    def test_endpoints(self):
+        user = User.objects.filter(is_superuser=True).first()
+        self.client.force_login(user)
+        urls = [
+            "/api/catalog/",
+            "/api/catalog/?sort=rating&sortType=dec&filter[name]=a",
+            "/api/catalog/?sort=date&cursor=",
+            "/api/catalog/facets/",
+            "/api/tags/",
+            "/api/categories/",
+            "/api/banners/",
+            "/api/products/popular/",
+            "/api/products/limited/",
+            "/api/products/?ids=1,2,3,0",
+            "/api/products/?ids=3,1&shape=list",
+            "/api/sales/",
+            "/api/basket/",
+            "/api/cache-stats/",
+            "/api/orders/",
+            "/api/profile/",
+            "/api/product/0/",
+        ]
+        urls += [
+            f"/api/product/{pk}/" for pk in Product.objects.values_list("pk", flat=True)
+        ]
+        urls += [
+            f"/api/categories/{pk}/breadcrumbs/"
+            for pk in Category.objects.values_list("pk", flat=True)
+        ]
+        urls += [
+            f"/api/order/{pk}/" for pk in user.order_set.values_list("pk", flat=True)
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.data)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+        # без orjson - JSONRenderer DRF
+        with mock.patch("onlinestore.renderers.orjson", None):
+            for url in urls:
+                with self.subTest(url=url, orjson=False):
+                    response = self.client.get(url)
+                    self.assertEqual(
+                        response.content, JSONRenderer().render(response.data)
+                    )
+
+
+class CompressionMiddlewareTestCase(TestCase):
+    """
+    Сжимаются только JSON ответы: HTML со CSRF-токеном не сжимается (BREACH)
+    """
+
+    fixtures = [FIXTURE]
+
+    def test_json(self):
+        response = self.client.get("/api/catalog/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_html(self):
+        response = self.client.get("/admin/login/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"csrfmiddlewaretoken", response.content)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class CatalogTagsFilterTestCase(TestCase):
+    """
+    Фильтр каталога по нескольким тегам (tagsMode=and/or), в том числе вместе с поиском
+    """
+
+    fixtures = [FIXTURE]
+
+    def catalog_ids(self, params):
+        response = self.client.get("/api/catalog/", params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item["id"] for item in response.data["items"])
+
+    def test_or(self):
+        self.assertEqual(self.catalog_ids({"tags[]": [1, 17]}), [1, 5, 6, 12])
+        self.assertEqual(
+            self.catalog_ids({"tags[]": [1, 17], "tagsMode": "or"}), [1, 5, 6, 12]
+        )
+
+    def test_and(self):
+        self.assertEqual(
+            self.catalog_ids({"tags[]": [1, 5], "tagsMode": "and"}), [5, 6]
+        )
+        self.assertEqual(self.catalog_ids({"tags[]": [1, 17], "tagsMode": "and"}), [])
+
+    def test_search(self):
+        self.assertEqual(self.catalog_ids({"filter[name]": "Оперативная"}), [4, 5, 12])
+        self.assertEqual(
+            self.catalog_ids({"filter[name]": "Оперативная", "tags[]": 17}), [12]
+        )
+        self.assertEqual(
+            self.catalog_ids(
+                {"filter[name]": "Оперативная", "tags[]": [1, 7], "tagsMode": "or"}
+            ),
+            [4, 5],
+        )
+        self.assertEqual(
+            self.catalog_ids(
+                {"filter[name]": "Оперативная", "tags[]": [5, 16], "tagsMode": "and"}
+            ),
+            [4, 5],
+        )
+
+    def test_search_and_specification(self):
+        ids = self.catalog_ids({"filter[name]": "Оперативная", "tags[]": [5, 16]})
+        attribute = Product.objects.get(pk=ids[0]).attributes.first()
+        self.assertIsNotNone(attribute)
+        self.assertIn(
+            ids[0],
+            self.catalog_ids(
+                {
+                    "filter[name]": "Оперативная",
+                    "tags[]": [5, 16],
+                    f"spec[{attribute.name}]": attribute.value,
+                }
+            ),
+        )
+
+
+class CatalogRelevanceSortTestCase(TestCase):
+    """
+    Сортировка каталога по релевантности поиска
+    """
+
+    fixtures = [FIXTURE]
+
+    def catalog_ids(self, params):
+        response = self.client.get("/api/catalog/", params)
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data["items"]]
+
+    def test_search(self):
+        ids = self.catalog_ids({"filter[name]": "Оперативная", "sort": "relevance"})
+        self.assertEqual(sorted(ids), [4, 5, 12])
+        self.assertEqual(
+            self.catalog_ids(
+                {"filter[name]": "Оперативная", "sort": "relevance", "cursor": ""}
+            ),
+            ids,
+        )
+
+    def test_without_search(self):
+        # без поискового запроса - сортировка по умолчанию (по цене)
+        for params in ({}, {"cursor": ""}, {"filter[name]": " ,. "}):
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.catalog_ids({**params, "sort": "relevance"}),
+                    self.catalog_ids({**params, "sort": "price"}),
+                )
+
+
+class CatalogPageOrderTestCase(TestCase):
+    """
+    Страницы LIMIT/OFFSET при равных значениях ключа сортировки: порядок по pk,
+    без повторов и пропусков, как у курсорной пагинации
+    """
+
+    fixtures = [FIXTURE]
+
+    def setUp(self):
+        Product.objects.update(rating=4)
+        cache.clear()
+
+    def pages(self, params):
+        ids, page, last = [], 1, 1
+        while page <= last:
+            response = self.client.get("/api/catalog/", {**params, "currentPage": page})
+            ids += [item["id"] for item in response.data["items"]]
+            page, last = page + 1, response.data["lastPage"]
+        return ids
+
+    def test_equal_keys(self):
+        ids = self.pages({"sort": "rating", "sortType": "dec"})
+        self.assertGreater(len(ids), 8)
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(self.pages({"sort": "rating", "sortType": "inc"}), ids[::-1])
+
+        response = self.client.get(
+            "/api/catalog/", {"sort": "rating", "sortType": "dec", "cursor": ""}
+        )
+        self.assertEqual([item["id"] for item in response.data["items"]], ids[:8])
+
+
+class ColumnarIndexTestCase(TestCase):
+    """
+    Инкрементальное обновление колоночного индекса по журналу ProductFeed совпадает
+    с полной перестройкой, при вытесненном журнале каталог работает через ORM
+    """
+
+    fixtures = [FIXTURE]
+
+    def setUp(self):
+        cache.clear()
+        ColumnarIndex.rebuild()
+        self.addCleanup(setattr, ColumnarIndex, "_snapshot", None)
+
+    def assertRebuilt(self, index):
+        expected = ColumnarIndex.from_rows(ColumnarIndex.load_rows())
+        for field in ColumnarIndex.FIELDS:
+            np.testing.assert_array_equal(
+                getattr(index, field), getattr(expected, field), err_msg=field
+            )
+
+    def test_refreshed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=3)
+            product.price = Decimal("1.50")
+            product.archived = True
+            product.save()
+            copy = Product.objects.get(pk=5)
+            copy.pk = None
+            copy.save()
+            Product.add_popularity([(2, 3, timezone.now())])
+        index = ColumnarIndex.get()
+        self.assertEqual(index.seq, ProductFeed.seq())
+        self.assertRebuilt(index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.delete()
+        self.assertRebuilt(ColumnarIndex.get())
+
+    def test_feed_evicted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.add_popularity([(2, 3, timezone.now())])
+        cache.delete(f"catalog:product_feed:{ProductFeed.seq()}")
+
+        with mock.patch.object(ColumnarIndex, "rebuild_in_background") as rebuild:
+            self.assertIsNone(ColumnarIndex.get())
+            with override_settings(CATALOG_COLUMNAR_INDEX=True):
+                columnar = self.client.get("/api/catalog/", {"sort": "popularity"})
+        rebuild.assert_called()
+        cache.clear()
+        orm = self.client.get("/api/catalog/", {"sort": "popularity"})
+        self.assertEqual(columnar.data, orm.data)
+
+
+class PopularityCacheTestCase(TestCase):
+    """
+    Заказ меняет популярность без сброса кэша каталога: обновляются только ответы,
+    зависящие от популярности
+    """
+
+    fixtures = [FIXTURE]
+
+    def setUp(self):
+        cache.clear()
+
+    def first_id(self, url):
+        response = self.client.get(url)
+        items = response.data["items"] if "items" in response.data else response.data
+        return items[0]["id"]
+
+    def test_add_popularity(self):
+        self.client.get("/api/catalog/")
+        popular = self.first_id("/api/products/popular/")
+        product = Product.objects.exclude(pk=popular).order_by("pk").first()
+        self.assertNotEqual(self.first_id("/api/catalog/?sort=popularity"), product.pk)
+
+        Product.add_popularity([(product.pk, 100, timezone.now())])
+
+        hits = CatalogCache.stats(["catalog"])["catalog"]["hits"]
+        self.client.get("/api/catalog/")
+        self.assertEqual(CatalogCache.stats(["catalog"])["catalog"]["hits"], hits + 1)
+        self.assertEqual(self.first_id("/api/products/popular/"), product.pk)
+        self.assertEqual(self.first_id("/api/catalog/?sort=popularity"), product.pk)
+
+
+class BasketBatchTestCase(TestCase):
+    """
+    Пакет операций с корзиной /api/basket/batch/
+    """
+
+    fixtures = [FIXTURE]
+    url = "/api/basket/batch/"
+
+    def setUp(self):
+        self.user = User.objects.create_user("basket-batch", password="x")
+
+    def batch(self, *operations):
+        return self.client.post(
+            self.url,
+            {
+                "operations": [
+                    {"op": op, "id": pk, "count": count} for op, pk, count in operations
+                ]
+            },
+            content_type="application/json",
+        )
+
+    def response_counts(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {item["id"]: item["count"] for item in response.data}
+
+    def user_counts(self):
+        return dict(
+            BasketItem.objects.filter(basket__user=self.user).values_list(
+                "product_id", "count"
+            )
+        )
+
+    def test_order(self):
+        self.client.force_login(self.user)
+        response = self.batch(
+            ("add", 1, 2),
+            ("set", 1, 5),
+            ("remove", 1, 2),
+            ("add", 2, 1),
+            ("remove", 3, 1),
+        )
+        self.assertEqual(self.response_counts(response), {1: 3, 2: 1})
+        self.assertEqual(self.user_counts(), {1: 3, 2: 1})
+
+        response = self.batch(("set", 2, 5), ("add", 2, 2), ("add", 1, 1))
+        self.assertEqual(self.response_counts(response), {1: 4, 2: 7})
+        self.assertEqual(self.user_counts(), {1: 4, 2: 7})
+
+    def test_set_zero(self):
+        self.client.force_login(self.user)
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product_id=1, count=2)
+        BasketItem.objects.create(basket=basket, product_id=2, count=1)
+        response = self.batch(("set", 1, 0), ("remove", 2, 5))
+        self.assertEqual(self.response_counts(response), {})
+        self.assertEqual(self.user_counts(), {})
+
+    def test_unknown_product(self):
+        self.client.force_login(self.user)
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product_id=1, count=2)
+        response = self.batch(("add", 2, 1), ("set", 1, 5), ("add", 0, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.data)
+        self.assertEqual(self.user_counts(), {1: 2})
+
+    def test_unknown_product_anonymous(self):
+        self.batch(("add", 1, 2))
+        response = self.batch(("add", 2, 1), ("set", 0, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.session["basket"], {"1": 2})
+
+    def test_anonymous(self):
+        self.response_counts(self.batch(("add", 1, 1)))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(
+                ("add", 1, 2), ("add", 2, 1), ("set", 3, 4), ("remove", 2, 1)
+            )
+        self.assertEqual(self.response_counts(response), {1: 3, 3: 4})
+        self.assertEqual(self.client.session["basket"], {"1": 3, "3": 4})
+        session_writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "django_session" in query["sql"]
+            and query["sql"].startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(len(session_writes), 1)
+
+    def test_login_merge(self):
+        self.batch(("add", 1, 2), ("add", 2, 1))
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product_id=1, count=3)
+        self.client.login(username="basket-batch", password="x")
+        response = self.batch(("add", 3, 1), ("remove", 2, 1))
+        self.assertEqual(self.response_counts(response), {1: 5, 3: 1})
+        self.assertEqual(self.user_counts(), {1: 5, 3: 1})
+        self.assertNotIn("basket", self.client.session)
+
+
+class ReviewStatsTestCase(TestCase):
+    """
+    Рейтинг, количество отзывов и гистограмма оценок продукта обновляются при изменении отзывов
+    """
+
+    fixtures = [FIXTURE]
+
+    def assertStats(self, product_id):
+        product = Product.objects.get(pk=product_id)
+        rates = list(
+            Review.objects.filter(product=product).values_list("rate", flat=True)
+        )
+        self.assertEqual(product.reviews_count, len(rates))
+        self.assertEqual(product.rating, sum(rates) / len(rates) if rates else None)
+        self.assertEqual(
+            product.rating_histogram or [0] * 5,
+            [rates.count(rate) for rate in range(1, 6)],
+        )
+
+    def test_fixture(self):
+        self.assertTrue(Review.objects.exists())
+        for product_id in Product.objects.values_list("pk", flat=True):
+            self.assertStats(product_id)
+
+    def test_change(self):
+        review = Review.objects.create(
+            product_id=1, author="a", email="a@example.com", text="t", rate=1
+        )
+        self.assertStats(1)
+        review.product_id = 2
+        review.save()
+        self.assertStats(1)
+        self.assertStats(2)
+        Review.objects.get(pk=review.pk).delete()
+        self.assertStats(2)
+        Review.objects.filter(product_id=2).delete()
+        self.assertStats(2)
+        self.assertEqual(Product.objects.get(pk=2).reviews_count, 0)
+
+
+class BasketConcurrencyTestCase(TransactionTestCase):
+    """
+    Параллельные изменения корзины пользователя не теряют обновлений
+    """
+
+    threads = 8
+    requests_per_thread = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user("basket-concurrency", password="x")
+        self.product = Product.objects.create(
+            title="Basket concurrency", price=100, count=100, created_by=self.user
+        )
+
+    def run_parallel(self, method, count=1, url="/api/basket/", data=None):
+        data = data or {"id": self.product.pk, "count": count}
+
+        def worker(_):
+            client = self.client_class()
+            client.force_login(self.user)
+            try:
+                return [
+                    getattr(client, method)(
+                        url, data, content_type="application/json"
+                    ).status_code
+                    for _ in range(self.requests_per_thread)
+                ]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            return [
+                code
+                for codes in executor.map(worker, range(self.threads))
+                for code in codes
+            ]
+
+    def basket_items(self):
+        return BasketItem.objects.filter(basket__user=self.user)
+
+    def test_parallel_add(self):
+        codes = self.run_parallel("post")
+        self.assertEqual(set(codes), {200})
+        self.assertEqual(Basket.objects.filter(user=self.user).count(), 1)
+        item = self.basket_items().get()
+        self.assertEqual(item.count, self.threads * self.requests_per_thread)
+
+    def test_parallel_batch(self):
+        # чтение и запись количеств пакета - в транзакции с блокировкой записи с начала
+        Basket.objects.create(user=self.user)
+        operations = [{"op": "add", "id": self.product.pk, "count": 1}]
+        codes = self.run_parallel(
+            "post", url="/api/basket/batch/", data={"operations": operations}
+        )
+        self.assertEqual(set(codes), {200})
+        item = self.basket_items().get()
+        self.assertEqual(item.count, self.threads * self.requests_per_thread)
+
+    def test_parallel_delete(self):
+        total = self.threads * self.requests_per_thread
+        basket = Basket.objects.create(user=self.user)
+        BasketItem.objects.create(basket=basket, product=self.product, count=total - 5)
+        codes = self.run_parallel("delete")
+        # позиция удаляется, когда количество доходит до нуля, лишние удаления отклоняются
+        self.assertEqual(codes.count(200), total - 5)
+        self.assertEqual(codes.count(400), 5)
+        self.assertFalse(self.basket_items().exists())
+
+    def test_missing_product(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            "/api/basket/", {"id": 0, "count": 1}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.basket_items().exists())
@@ -2,24 +2,37 @@ from django.urls import path
 
 from .api import (
     CatalogAPIView,
+    CatalogFacetsAPIView,
     TagsAPIView,
     CategoriesAPIView,
+    CategoryBreadcrumbsAPIView,
     BannersAPIView,
     ProductsPopularAPIView,
     ProductsLimitedAPIView,
     ProductsSalesAPIView,
+    HomeAPIView,
     ProductAPIView,
+    ProductsBatchAPIView,
     ProductReviewAPIView,
     BasketAPIView,
+    BasketBatchAPIView,
+    CacheStatsAPIView,
 )
 
 app_name = "catalog"
 
 urlpatterns = [
     path("catalog/", CatalogAPIView.as_view(), name="catalog"),
+    path("catalog/facets/", CatalogFacetsAPIView.as_view(), name="catalog_facets"),
     path("tags/", TagsAPIView.as_view(), name="tags"),
     path("categories/", CategoriesAPIView.as_view(), name="categories"),
+    path(
+        "categories/<int:id>/breadcrumbs/",
+        CategoryBreadcrumbsAPIView.as_view(),
+        name="category_breadcrumbs",
+    ),
     path("banners/", BannersAPIView.as_view(), name="banners"),
+    path("products/", ProductsBatchAPIView.as_view(), name="products_batch"),
     path(
         "products/popular/", ProductsPopularAPIView.as_view(), name="products_popular"
     ),
@@ -33,5 +46,8 @@ urlpatterns = [
         name="product-review",
     ),
     path("sales/", ProductsSalesAPIView.as_view(), name="sales"),
+    path("home/", HomeAPIView.as_view(), name="home"),
     path("basket/", BasketAPIView.as_view(), name="basket"),
+    path("basket/batch/", BasketBatchAPIView.as_view(), name="basket_batch"),
+    path("cache-stats/", CacheStatsAPIView.as_view(), name="cache_stats"),
 ]
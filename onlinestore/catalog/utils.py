@@ -1,5 +1,3 @@
-from django.db.models import Avg
-
 from .models import Product, Basket, BasketItem
 from .serializers import ProductsHomePageSerializer
 
@@ -12,9 +10,6 @@ def products_home_page(stop=-1, sort_index=None, limit_edition=False):
         Product.objects.defer("created_by", "archived", "fullDescription")
         .defer("description", "count", "freeDelivery", "date", "tags", "category")
         .prefetch_related("image_set")
-        .annotate(
-            rating=Avg("review__rate"),
-        )
         .filter(
             **({"sortIndex__lte": sort_index} if sort_index else {}),
             **({"limitedEdition": True} if limit_edition else {}),
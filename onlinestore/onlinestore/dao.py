@@ -1,3 +1,8 @@
+from contextlib import contextmanager
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router, transaction
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 
 
@@ -29,7 +34,7 @@ class DAO:
         :param select_related:
         :param annotate:
         :param filter:
-        :param order_by:
+        :param order_by: field name or tuple of field names
         :param ext_method: use one of  (all, first, distinct)
         :param get_object_or_404_params: specify a dictionary of parameters if you need to pass an object to get_object_or_404(**kwargs)
         :param get: specify a dictionary of parameters if you need to pass an object to get(**kwargs)
@@ -55,7 +60,7 @@ class DAO:
             obj.prefetch_related(*prefetch_related)
             .annotate(**annotate)
             .filter(**filter)
-            .order_by(order_by)
+            .order_by(*((order_by,) if isinstance(order_by, str) else order_by))
         )
 
         if ext_method:
@@ -69,6 +74,81 @@ class DAO:
 
         return obj
 
+    @classmethod
+    def paginate(cls, obj, page, limit, count_obj=None):
+        """
+        Page selection on the database side: LIMIT/OFFSET for the rows of the page and a separate COUNT
+        :param obj: queryset of the page, prefetch_related is applied only to the selected rows
+        :param page: page number, starting from 1
+        :param limit: number of rows on the page
+        :param count_obj: lightweight queryset for COUNT (without annotations and prefetch), default obj
+        :return: (page queryset, total number of rows)
+        """
+        count_obj = obj if count_obj is None else count_obj
+        numbers = count_obj.count()
+        if page < 1:
+            return obj.none(), numbers
+
+        start = (page - 1) * limit
+        return obj[start : start + limit], numbers
+
+    @classmethod
+    def paginate_keyset(cls, obj, key="pk", descending=False, last=None, limit=20):
+        """
+        Keyset (cursor) pagination over (key, pk) without OFFSET, rows with NULL key are placed last.
+        For a NOT NULL model field the NULL handling is omitted, so an index on the key can serve the query
+        :param obj: queryset (models or values() with key and pk), its ordering is replaced by (key, pk)
+        :param key: field or annotation to sort by
+        :param descending: sort direction
+        :param last: (key value, pk) of the last row of the previous page, None for the first page
+        :param limit: number of rows on the page
+        :return: (list of objects of the page, (key value, pk) of the last object or None if there are no more rows)
+        """
+        lookup = "lt" if descending else "gt"
+        try:
+            nullable = obj.model._meta.get_field(key).null
+        except FieldDoesNotExist:
+            # annotation
+            nullable = True
+
+        if key == "pk":
+            ordering = ("-pk",) if descending else ("pk",)
+        elif not nullable:
+            ordering = (f"-{key}", "-pk") if descending else (key, "pk")
+        elif descending:
+            ordering = (F(key).desc(nulls_last=True), "-pk")
+        else:
+            ordering = (F(key).asc(nulls_last=True), "pk")
+
+        if last is not None:
+            value, pk = last
+            after_pk = Q(**{f"pk__{lookup}": pk})
+            if key == "pk":
+                condition = after_pk
+            elif not nullable:
+                condition = Q(**{f"{key}__{lookup}": value}) | (
+                    Q(**{key: value}) & after_pk
+                )
+            elif value is None:
+                condition = Q(**{f"{key}__isnull": True}) & after_pk
+            else:
+                condition = (
+                    Q(**{f"{key}__{lookup}": value})
+                    | (Q(**{key: value}) & after_pk)
+                    | Q(**{f"{key}__isnull": True})
+                )
+            obj = obj.filter(condition)
+
+        rows = list(obj.order_by(*ordering)[: limit + 1])
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        if isinstance(rows[-1], dict):
+            # obj is a values() queryset, it must contain key and pk
+            return rows, (rows[-1][key], rows[-1]["pk"])
+        return rows, (getattr(rows[-1], key), rows[-1].pk)
+
     @classmethod
     def user_create(cls, User, data_dict):
         user = User.objects.create_user(**data_dict)
@@ -86,3 +166,71 @@ class DAO:
     @classmethod
     def create_object(cls, model, data_dict):
         return model.objects.create(**data_dict)
+
+    @classmethod
+    @contextmanager
+    def write_transaction(cls, model):
+        """
+        Transaction for a read-modify-write block: on SQLite it starts with BEGIN IMMEDIATE and takes
+        the write lock before the first read, so concurrent blocks wait for the busy timeout instead of
+        failing with "database is locked" on the lock upgrade. Inside another transaction it is a savepoint
+        :param model: model of the written rows, selects the database
+        """
+        using = router.db_for_write(model)
+        connection = connections[using]
+        if connection.vendor != "sqlite" or connection.in_atomic_block:
+            with transaction.atomic(using=using):
+                yield
+            return
+
+        # transaction_mode of the connection is used only by BEGIN of the outermost atomic block
+        mode = connection.transaction_mode
+        connection.transaction_mode = "IMMEDIATE"
+        try:
+            with transaction.atomic(using=using):
+                connection.transaction_mode = mode
+                yield
+        finally:
+            connection.transaction_mode = mode
+
+    @classmethod
+    def upsert_increment(cls, model, lookup, field, amount, exists=None):
+        """
+        Insert a row or increment a field of the existing row in one statement
+        (INSERT ... ON CONFLICT DO UPDATE, SQLite 3.24+ and PostgreSQL), without a read-modify-write race
+        :param model: model with a unique constraint on the lookup fields
+        :param lookup: dictionary {field: value} of the unique fields
+        :param field: field to increment, a new row gets amount
+        :param amount: increment
+        :param exists: (model, pk) - the row is written only if this object exists, the check is a part of the statement
+        :return: number of written rows, 0 if the object from exists does not exist
+        """
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        meta = model._meta
+        table = quote(meta.db_table)
+        keys = [quote(meta.get_field(name).column) for name in lookup]
+        target = quote(meta.get_field(field).column)
+        params = [*lookup.values(), amount]
+
+        sql = (
+            f"INSERT INTO {table} ({', '.join([*keys, target])}) "
+            f"SELECT {', '.join(['%s'] * len(params))}"
+        )
+        if exists:
+            exists_model, pk = exists
+            sql += (
+                f" WHERE EXISTS (SELECT 1 FROM {quote(exists_model._meta.db_table)}"
+                f" WHERE {quote(exists_model._meta.pk.column)} = %s)"
+            )
+            params.append(pk)
+        else:
+            # SQLite parses ON CONFLICT after SELECT only with a WHERE clause
+            sql += " WHERE TRUE"
+        sql += (
+            f" ON CONFLICT ({', '.join(keys)})"
+            f" DO UPDATE SET {target} = {table}.{target} + excluded.{target}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
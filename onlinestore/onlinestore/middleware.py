@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+
+import zstandard
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+# кодировки в порядке предпочтения сервера
+ENCODINGS = ("zstd", "gzip")
+# только JSON API: HTML-страницы содержат CSRF-токен и при сжатии уязвимы к BREACH
+COMPRESSED_TYPES = ("application/json",)
+STATS_PREFIX = "compression:stats"
+STATS_KEYS = ("responses", "originalBytes", "compressedBytes", "cacheHits")
+
+
+def accepted_encoding(header) -> str | None:
+    """
+    Выбор кодировки по заголовку Accept-Encoding, None - без сжатия
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding) -> bytes:
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL)
+        return compressor.compress(content)
+    return gzip.compress(
+        content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0
+    )
+
+
+def compression_stats() -> dict:
+    """
+    Статистика сжатия: количество сжатых ответов, объем до и после сжатия, экономия
+    """
+    values = cache.get_many([f"{STATS_PREFIX}:{key}" for key in STATS_KEYS])
+    stats = {key: values.get(f"{STATS_PREFIX}:{key}", 0) for key in STATS_KEYS}
+    stats["savedBytes"] = stats["originalBytes"] - stats["compressedBytes"]
+    return stats
+
+
+class CompressionMiddleware:
+    """
+    Сжатие JSON ответов zstd или gzip по заголовку Accept-Encoding.
+    Сжатые тела ответов с ETag кэшируются по ETag и кодировке: неизменные ответы
+    (категории, баннеры) сжимаются один раз, а не на каждый запрос
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not response.get("Content-Type", "").startswith(COMPRESSED_TYPES)
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        content = response.content
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = accepted_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        etag = response.get("ETag")
+        if etag and response.status_code == 200:
+            key = self.cache_key(etag, encoding)
+            compressed = cache.get(key)
+            cache_hit = compressed is not None
+            if not cache_hit:
+                compressed = compress(content, encoding)
+                cache.set(key, compressed, timeout=settings.COMPRESSION_CACHE_TIMEOUT)
+        else:
+            cache_hit = False
+            compressed = compress(content, encoding)
+
+        # сжатие не всегда выгодно на небольших или уже сжатых данных
+        if len(compressed) >= len(content):
+            return response
+
+        self.count(len(content), len(compressed), cache_hit)
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # сжатое представление отличается побайтно, ETag становится слабым, как в GZipMiddleware
+        if etag and not etag.startswith("W/"):
+            response["ETag"] = f"W/{etag}"
+        return response
+
+    @staticmethod
+    def cache_key(etag, encoding) -> str:
+        level = (
+            settings.COMPRESSION_ZSTD_LEVEL
+            if encoding == "zstd"
+            else settings.COMPRESSION_GZIP_LEVEL
+        )
+        digest = hashlib.sha1(etag.encode()).hexdigest()
+        return f"compression:{encoding}:{level}:{digest}"
+
+    @staticmethod
+    def count(original, compressed, cache_hit):
+        values = {
+            "responses": 1,
+            "originalBytes": original,
+            "compressedBytes": compressed,
+            "cacheHits": int(cache_hit),
+        }
+        for key, value in values.items():
+            if not value:
+                continue
+            try:
+                cache.incr(f"{STATS_PREFIX}:{key}", value)
+            except ValueError:
+                cache.set(f"{STATS_PREFIX}:{key}", value, timeout=None)
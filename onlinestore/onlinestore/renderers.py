@@ -0,0 +1,62 @@
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # используется стандартный json
+    orjson = None
+
+
+class FastJSONEncoder(encoders.JSONEncoder):
+    """
+    JSONEncoder DRF с поддержкой PhoneNumber
+    """
+
+    def default(self, obj):
+        if isinstance(obj, PhoneNumber):
+            return str(obj)
+        return super().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: словари, списки, строки и числа сериализуются нативно,
+    Decimal, datetime, PhoneNumber и прочие типы - так же, как в JSONRenderer DRF, вывод совпадает побайтно.
+    Без orjson, с отступами (browsable API) и для данных, которые orjson не поддерживает,
+    используется JSONRenderer DRF (json.dumps с C-ускорителем)
+    """
+
+    encoder_class = FastJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if (
+            orjson is not None
+            and indent is None
+            and self.compact
+            and not self.ensure_ascii
+        ):
+            try:
+                ret = orjson.dumps(
+                    data,
+                    default=self.encoder_class().default,
+                    option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+                )
+            except (orjson.JSONEncodeError, ValueError):
+                pass
+            else:
+                return self.escape_separators(ret)
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    @staticmethod
+    def escape_separators(ret) -> bytes:
+        # U+2028 и U+2029 допустимы в JSON, но не в JavaScript, как в JSONRenderer
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 import logging.config
 
@@ -23,6 +24,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": str(BASE_DIR / "db.sqlite3"),
+        # параллельные запросы ждут блокировку записи timeout секунд; блоки чтение-изменение-запись
+        # захватывают ее при BEGIN (DAO.write_transaction)
+        "OPTIONS": {"timeout": 20},
+        # тестовая БД в файле: в памяти SQLite блокирует таблицы без ожидания, что исключает тесты
+        # параллельных запросов
+        "TEST": {"NAME": str(BASE_DIR / "test_db.sqlite3")},
     }
 }
 
@@ -69,6 +76,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "onlinestore.middleware.CompressionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -78,6 +86,50 @@ MIDDLEWARE = [
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 
+# общий кэш для всех воркеров и management-команд: инвалидация кэша каталога (счетчики поколений)
+# должна доходить до всех процессов. По умолчанию - файлы в каталоге проекта (общий том контейнеров),
+# в продакшене можно задать redis или memcached. Кэш процесса (LocMemCache) - только для разработки
+# и тестов: файловый кэш пережил бы тестовую БД и отдавал ответы прошлого запуска
+TESTING = sys.argv[1:2] == ["test"]
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND",
+            (
+                "django.core.cache.backends.locmem.LocMemCache"
+                if TESTING
+                else "django.core.cache.backends.filebased.FileBasedCache"
+            ),
+        ),
+        "LOCATION": os.getenv(
+            "DJANGO_CACHE_LOCATION", "onlinestore" if TESTING else str(BASE_DIR / "cache")
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# время жизни закэшированных ответов каталога, сек
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))
+
+# фильтрация и сортировка каталога по колоночному индексу в памяти (требуется numpy)
+CATALOG_COLUMNAR_INDEX = os.getenv("CATALOG_COLUMNAR_INDEX", "0") == "1"
+
+# количество последних отзывов в ответе продукта, остальные - через /api/product/<id>/reviews/
+PRODUCT_REVIEWS_LIMIT = int(os.getenv("PRODUCT_REVIEWS_LIMIT", 10))
+
+# период полураспада популярности продуктов по заказам, дней
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", 30))
+
+# количество рекомендаций "с этим товаром покупают" на продукт
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", 10))
+
+# сжатие JSON/HTML ответов (zstd, gzip): уровни, минимальный размер тела в байтах,
+# время жизни сжатых тел ответов с ETag в кэше, сек
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 512))
+COMPRESSION_CACHE_TIMEOUT = int(os.getenv("COMPRESSION_CACHE_TIMEOUT", 3600))
+
 ROOT_URLCONF = "onlinestore.urls"
 
 TEMPLATES = [
@@ -158,6 +210,11 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
     # подключение фильтров
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # JSON на orjson (если установлен), вывод совпадает с JSONRenderer
+    "DEFAULT_RENDERER_CLASSES": [
+        "onlinestore.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     # для генерации схемы API в формате OpenAPI 3
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     # "DEFAULT_PARSER_CLASSES ": ["rest_framework.parsers.JSONParser", "rest_framework.parsers.FormParser", "rest_framework.parsers.MultiPartParser"]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "onlinestore.settings")
 
 application = get_wsgi_application()
+
+# колоночный индекс каталога строится при старте воркера, а не на первом запросе
+from catalog.columnar_index import ColumnarIndex  # noqa: E402
+
+ColumnarIndex.warm()
@@ -16,6 +16,9 @@ from django.db.models import (
 from catalog.models import Product
 from phonenumber_field.modelfields import PhoneNumberField
 
+# статусы оформленного заказа, такие заказы учитываются в популярности продуктов
+PLACED_STATUSES = ("confirmed", "completed")
+
 
 class Order(Model):
     user = ForeignKey(User, on_delete=PROTECT)
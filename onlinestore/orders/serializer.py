@@ -1,4 +1,3 @@
-from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework.fields import IntegerField, SerializerMethodField
@@ -61,11 +60,8 @@ class ProductSerializer(ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_price(self, obj):
-        now = timezone.now()
-        if obj.dateFrom and obj.dateTo:
-            if obj.dateFrom <= now and obj.dateTo >= now:
-                return obj.salePrice
-        return obj.price
+        # аннотация Product.effective_price_sql
+        return obj.effective_price
 
 
 class GetOrderSerializer(ModelSerializer):
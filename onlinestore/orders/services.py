@@ -1,14 +1,16 @@
 import json
 
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework.response import Response
 
-from .models import Order
+from .models import Order, OrderProduct, PLACED_STATUSES
 from .serializer import (
     OrderSerializer,
     GetOrderSerializer,
 )
 
-from catalog.models import Basket
+from catalog.models import Basket, Product
 from onlinestore.dao import DAO
 
 
@@ -44,7 +46,14 @@ class OrderService:
         order = DAO.search_object_by_fields(
             model=Order,
             defer=("createdAt",),
-            prefetch_related=("products",),
+            prefetch_related=(
+                Prefetch(
+                    "products",
+                    queryset=Product.objects.annotate(
+                        effective_price=Product.effective_price_sql()
+                    ),
+                ),
+            ),
             get_object_or_404_params={"pk": id},
         )
         products_in_order = order.product_items.all()
@@ -82,8 +91,9 @@ class OrderService:
         order.totalCost = sum(
             [item["count"] * item["price"] for item in data["products"]]
         )
-        order.status = "confirmed"
-        order.save()
+        with transaction.atomic():
+            cls._place_order(order, "confirmed")
+            order.save()
 
         basket = Basket.objects.get(user=request.user)
         basket.items.all().delete()
@@ -97,7 +107,32 @@ class OrderService:
         order = DAO.search_object_by_fields(
             model=Order, get_object_or_404_params={"pk": id}
         )
-        order.status = "completed"
         order.paymentData = paymentData
-        order.save()
+        with transaction.atomic():
+            cls._place_order(order, "completed")
+            order.save()
         return Response({"message": "successful operation"})
+
+    @staticmethod
+    def _place_order(order, status):
+        """
+        Перевод заказа в статус status. Продукты заказа учитываются в популярности и рекомендациях один раз,
+        при первом переходе в оформленный статус: условный UPDATE исключает повторный учет
+        при повторных и параллельных запросах
+        """
+        placed = (
+            Order.objects.filter(pk=order.pk)
+            .exclude(status__in=PLACED_STATUSES)
+            .update(status=status)
+        )
+        order.status = status
+        if placed:
+            Product.add_popularity(
+                OrderProduct.objects.filter(order=order).values_list(
+                    "product_id", "count", "order__createdAt"
+                )
+            )
+            # рекомендации продуктов заказа пересчитываются пакетно (update_recommendations)
+            Product.objects.filter(order_items__order=order).update(
+                co_purchases_stale=True
+            )